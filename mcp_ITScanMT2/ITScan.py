@@ -11,19 +11,16 @@
 ##########################################################################
 
 from ITScanCore import *
-from ROOT import TH1F, TCanvas, kFALSE, TFile, TGraphErrors
 from array import array
+import numpy
 from threading import Thread, Semaphore
+from multiprocessing import Pool
 from time import clock
+import time
 
 DEB_1 = False
 DEB_2 = False
 
-root_sys = os.environ.get('ROOTSYS')
-if ( root_sys == None ) or ( root_sys == '' ):
-    print ' --> I cannot work here... Set the LHCb environment first!'
-    sys.exit(1)
-
 # -> set plotting options
 #set_root_env()
 
@@ -37,80 +34,87 @@ FIRST_BIN = 1
 I_hv = 1
 MAX_THREADS = 100
 
+def scan_tag(path):
+    ''' Name of a scan in batch mode, the name of its data folder '''
+    return ( os.path.basename(os.path.normpath(path)) )
+
+def scan_name(opts, name):
+    ''' Name of a ROOT object or an output file of the scan, prefixed with
+        the scan tag in batch mode so that the scans never overwrite each
+        other, unchanged when a single scan is processed '''
+    if opts == None or opts.get('scan_tag') in ( None, '' ):
+        return ( name )
+    return ( opts['scan_tag'] + '_' + name )
+
 #simple wrappers
 def HVCMTarget(hv_mapper):
 	#Works as a target for a thread
 	print 'Starting hvcm_thread'
-	hv_mapper.append(HVChannelMapper())
+	with TRACER.span('channel_map'):
+		hv_mapper.append(HVChannelMapper())
 	print 'Ending hvcm_thread'
 
-def HVCDTarget(hv_decoder, path):
+def HVCDTarget(hv_decoder, path, source, opts, pool):
 	#Works as a target for a thread
 	print 'Starting hvcd_thread'
-	hv_decoder.append(HVCurrentDecoder(path))
+	with TRACER.span('hv_decode'):
+		hv_decoder.append(HVCurrentDecoder(path, source = source, cache = opts.get('cache', True), cache_dir = opts.get('cache_dir'), pool = pool))
 	print 'Ending hvcd_thread'
 	
-def TempDTarget(t_decoder, path):
+def TempDTarget(t_decoder, path, source, opts, pool):
 	#Works as a target for a thread
 	print 'Starting tempd_thread'
-	t_decoder.append(TemperatureDecoder(path))
+	with TRACER.span('temp_decode'):
+		t_decoder.append(TemperatureDecoder(path, source = source, cache = opts.get('cache', True), cache_dir = opts.get('cache_dir'), pool = pool))
 	print 'Ending tempd_thread'
 	
+@traced('hv_plots')
 def hv_plots(hv_decoder, hv_histo_list, hv_mapper, opts, semaph_file):
 	if hv_decoder.getStatus() == SUCCESS:
 		print ' --> the decoder has been initialised correctly '
 		print ' --> plotting HV histograms... '
-		hvi_data = hv_decoder.getData()
-		hv_channels = hvi_data.keys()
+		hv_columns = hv_decoder.getColumns()
+		hv_channels = hv_columns.getChannels()
 		
 		# -> book and fill histos
 		for channel in sorted(hv_channels):
-			hvi_t_points = hvi_data[channel]
-		
-			# -> define the range, name and title
-			time_start = hvi_t_points[0][TIME].split(':')
-			time_stop = hvi_t_points[-1][TIME].split(':')
-			first_bin = int(time_start[0])*HOUR + int(time_start[1])*MINUTE + int(time_start[2])
-			last_bin = int(time_stop[0])*HOUR + int(time_stop[1])*MINUTE + int(time_stop[2])
-			name = 'h_' + hv_mapper.HVChannel2Label(channel)
-			title = ' HV currents for sensor ' + hv_mapper.HVChannel2Label(channel)
-			bins = (last_bin - first_bin)
-			histo = TH1F(name, title, bins, first_bin, last_bin)
-			histo.SetStats(kFALSE)
-			histo.SetOption("P")
-			
-			# -> fill histograms
-			for point in hvi_t_points:
-				time_ = point[TIME].split(':')
-				bin = int(time_[0])*HOUR + int(time_[1])*MINUTE + int(time_[2])
-				histo.SetBinContent((bin - first_bin), round(float(point[HVI]), 5))
+			seconds, values = hv_columns.getSeries(channel)
+			with TRACER.span('channel', points = len(seconds)):
+				# -> define the range, name and title
+				first_bin = int(seconds[FIRST])
+				last_bin = int(seconds[LAST])
+				name = scan_name(opts, 'h_' + hv_mapper.HVChannel2Label(channel))
+				title = ' HV currents for sensor ' + hv_mapper.HVChannel2Label(channel)
+				bins = (last_bin - first_bin)
+				histo = book_histo(name, title, bins, first_bin, last_bin, opts.get('histo_backend', HISTO_BACKEND))
+				histo.SetStats(False)
+				histo.SetOption("P")
 				histo.GetXaxis().SetTitle('time [s]')
 				histo.GetXaxis().SetLabelSize(0.03)
 				histo.GetYaxis().SetTitle('HV current [mA]')
 				histo.GetYaxis().SetLabelSize(0.03)
 			
-			# -> store the histograms
-			hv_histo_list[channel] = [ histo, first_bin ]
+				# -> fill histograms, all the points in one go
+				fill_histo(histo, seconds - first_bin, round_values(values, 5))
+			
+				# -> store the histograms
+				hv_histo_list[channel] = [ histo, first_bin ]
 	
 	else:
 		print ' --> problem with initialisation! '
 	
+	# -> seconds without a reading hold the previous reading, a real
+	#    zero reading is kept as it is
 	for channel in hv_histo_list:
 		hist = hv_histo_list[channel][HIST]
-		name = hist.GetName()
-		#print ' -> Removing zeros in histogram: ', '\033[91m' + name + '\033[0m'
-		nbins = hist.GetNbinsX()
-		for bin in range(2, nbins):
-			temp = hist.GetBinContent(bin)
-			if ( temp < 0.0001 and temp > -0.0001 ):
-				temp_prev = hist.GetBinContent(bin -1)
-				hist.SetBinContent(bin, temp_prev)
+		forward_fill_gaps(hist, 2, hist.GetNbinsX())
 		
 	
 			
 
 		  
-def t_plots(t_decoder, T_histo_list, TEMP_DATA, STABLE_TEMP_MEAN_RISING, STABLE_TEMP_MEAN_FALLING, STABLE_TEMP_MEAN, BAD_CHANNELS, hv_decoder, opts, semaph_file):
+@traced('t_plots')
+def t_plots(t_decoder, T_histo_list, opts, semaph_file):
 	
 	if t_decoder.getStatus() == SUCCESS:
 		print ' --> the decoder has been initialised correctly '
@@ -129,132 +133,93 @@ def t_plots(t_decoder, T_histo_list, TEMP_DATA, STABLE_TEMP_MEAN_RISING, STABLE_
 						print point
 		
 		# -> book and fill histos
+		t_columns = t_decoder.getColumns()
 		for channel in sorted(t_channels):
-			t_t_points = t_data[channel]
-			# -> define the range, name and title
-			# -> find the first measurement not equal zero for a given sensor
-			time_start = t_t_points[0][TIME].split(':')
-			first_bin = int(time_start[0])*HOUR + int(time_start[1])*MINUTE + int(time_start[2])
-			time_stop = t_t_points[-1][TIME].split(':')
-			last_bin = int(time_stop[0])*HOUR + int(time_stop[1])*MINUTE + int(time_stop[2])
-			name = 'temp_' + channel
-			title = ' Temperatures for sensor ' + channel
-			bins = (last_bin - first_bin) + 1000
-			histo = TH1F(name, title, bins, first_bin - 499.5, last_bin + 500.5)
-			histo.SetStats(kFALSE)
-			histo.SetOption("P")            
-			
-			# -> fill histograms
-			for point in t_t_points:                
-				time_ = point[TIME].split(':')
-				bin = int(time_[0])*HOUR + int(time_[1])*MINUTE + int(time_[2])                
-				histo.SetBinContent((bin - first_bin + 499), round(float(point[TEMP]), 2))
-				if opts['plot'] and DEB_1:
-					print bin,  float(point[TEMP])
+			seconds, values = t_columns.getSeries(channel)
+			with TRACER.span('channel', points = len(seconds)):
+				# -> define the range, name and title
+				# -> find the first measurement not equal zero for a given sensor
+				first_bin = int(seconds[FIRST])
+				last_bin = int(seconds[LAST])
+				name = scan_name(opts, 'temp_' + channel)
+				title = ' Temperatures for sensor ' + channel
+				bins = (last_bin - first_bin) + 1000
+				histo = book_histo(name, title, bins, first_bin - 499.5, last_bin + 500.5, opts.get('histo_backend', HISTO_BACKEND))
+				histo.SetStats(False)
+				histo.SetOption("P")            
 				histo.GetXaxis().SetTitle('time [s]')
 				histo.GetXaxis().SetLabelSize(0.03)
 				histo.GetYaxis().SetTitle('Temperature [deg]')
 				histo.GetYaxis().SetLabelSize(0.03)
 			
-			# -> store the histograms    
-			T_histo_list.append(histo)
+				# -> fill histograms, all the points in one go
+				fill_histo(histo, seconds - first_bin + 499, round_values(values, 2))
+				if opts['plot'] and DEB_1:
+					for bin, temp in zip(seconds.tolist(), values.tolist()):
+						print bin, temp
 			
-			filtered_lists = []
-			consecutive_t_list = []
-			###########################
-			## --> Pattern recognition
-			###########################
+				# -> store the histograms    
+				T_histo_list.append(histo)
 			
-			for index, point in enumerate(t_t_points):
-				if channel == 'VL01_CB' and DEB_1:
-					print index, point
-				if index == ( len(t_t_points) - 1 ):
-					if len(consecutive_t_list) == 0:
-						consecutive_t_list.append(point)
-						filtered_lists.append(consecutive_t_list)
-					else:
-						last_entry = consecutive_t_list[-1]
-						if int(float(last_entry[TEMP])) == int(float(point[TEMP])):
-							consecutive_t_list.append(point)
-							filtered_lists.append(consecutive_t_list)
-							break
-						else:
-							filtered_lists.append(consecutive_t_list)
-							consecutive_t_list = []
-							consecutive_t_list.append(point)
-							filtered_lists.append(consecutive_t_list)
-							break
-				if len(consecutive_t_list) == 0:
-					consecutive_t_list.append(point)
-					if index == ( len(t_t_points) -1 ):
-						filtered_lists.append(consecutive_t_list)
-						break
-				else:
-					last_entry = consecutive_t_list[-1]
-					if int(float(last_entry[TEMP])) == int(float(point[TEMP])):
-						consecutive_t_list.append(point)
-						if index == ( len(t_t_points) -1 ):
-							filtered_lists.append(consecutive_t_list)
-							break
-					else:
-						filtered_lists.append(consecutive_t_list)
-						consecutive_t_list = []
-						consecutive_t_list.append(point)
-						if index == ( len(t_t_points) -1 ):
-							filtered_lists.append(consecutive_t_list)
-							break                            
-			TEMP_DATA[channel] = filtered_lists
-			if channel == 'VL02_AB' and DEB_1:
-				print filtered_lists
+	else:
+		print ' --> problem with initialisation! '
+	
+	# -> seconds without a reading stay in the validity mask of the
+	#    histograms, write_scan_histos marks them with -199 for the output
+		
+	
+
+
+@traced('temp_plateaus')
+def temp_plateaus(t_decoder, TEMP_DATA, STABLE_TEMP_MEAN_RISING, STABLE_TEMP_MEAN_FALLING, STABLE_TEMP_MEAN, BAD_CHANNELS):
+	if t_decoder.getStatus() == SUCCESS:
+		t_data = t_decoder.getData()
+		t_columns = t_decoder.getColumns()
+		TEMP_RUNS = {}
+		
+		for channel in sorted(t_data.keys()):
+			with TRACER.span('channel') as span:
+				t_t_points = t_data[channel]
+				###########################
+				## --> Pattern recognition
+				###########################
+				# -> runs of consecutive points with the same integer temperature,
+				#    found in one pass over the columnar temperatures
+				starts, ends, lengths, means = find_plateaus(t_columns.getValues(channel))
+				TEMP_RUNS[channel] = [starts, ends, lengths, means]
+				span.count(plateaus = len(starts))
+				filtered_lists = [ t_t_points[start:end] for start, end in zip(starts.tolist(), ends.tolist()) ]
+				TEMP_DATA[channel] = filtered_lists
+				if channel == 'VL02_AB' and DEB_1:
+					print filtered_lists
 			
 		###############################
 		## --> Filter out oscillations
 		###############################
-		STABLE_TEMP_DATA = {}
-		stable_t_lists = []
+		STABLE_TEMP_RUNS = {}
 		for channel in sorted(TEMP_DATA):
-			stable_t_lists = []
-			lists = TEMP_DATA[channel]
-			for list in lists:
-				if len(list) == 1:
-					continue
-				else:
-					stable_t_lists.append(list)
-			for index, stable_list in enumerate(stable_t_lists):
-				if index != ( len(stable_t_lists) - 1 ):
-					next_stable_list = stable_t_lists[index + 1]
-					first_t = int( float( stable_list[0][TEMP] ) )
-					next_t = int( float( next_stable_list[0][TEMP] ) )
-					if first_t == next_t:
-						if len( stable_list ) >= len( next_stable_list ):
-							stable_t_lists.remove( next_stable_list )
-						else:
-							stable_t_lists.remove( stable_list )
-			STABLE_TEMP_DATA[channel] = stable_t_lists
-			# -> reset
-			stable_t_lists = []
+			# -> single points are dropped, neighbouring runs at the same
+			#    integer temperature are merged keeping the longer one
+			starts, ends, lengths, means = TEMP_RUNS[channel]
+			keys = numpy.trunc(t_columns.getValues(channel)[starts])
+			stable_runs = merge_oscillations(keys, lengths)
+			STABLE_TEMP_RUNS[channel] = [ starts[stable_runs], ends[stable_runs], means[stable_runs] ]
 		
 		###########################
 		## --> Time ordering
 		###########################
-		for channel in sorted(STABLE_TEMP_DATA):
+		for channel in sorted(STABLE_TEMP_RUNS):
 			if channel not in BAD_CHANNELS:
-				stable_lists = STABLE_TEMP_DATA[channel]
-				stable_mean_points = []
-				stable_mean_values = []
+				# -> time range and mean of each stable run, taken from the
+				#    run arrays without going over the points again
+				starts, ends, means = STABLE_TEMP_RUNS[channel]
+				times = t_columns.getTime(channel)
+				time_starts = times[starts].tolist()
+				time_ends = times[ends - 1].tolist()
+				stable_mean_values = [ round(mean, 2) for mean in means.tolist() ]
+				stable_mean_points = [ [[time_start, time_end], mean] for time_start, time_end, mean in zip(time_starts, time_ends, stable_mean_values) ]
 				stable_mean_points_rising = []
 				stable_mean_points_falling = []
-				for list in stable_lists:
-					mean = 0
-					time_start = list[FIRST][TIME]
-					time_end = list[LAST][TIME]
-					for point in list:
-						mean += float( point[TEMP] )
-					mean /= len(list)
-					temp_range = [time_start, time_end]
-					mean_point = [temp_range, round(mean,2)]
-					stable_mean_points.append( mean_point )
-					stable_mean_values.append( round(mean,2) )
 				if len(stable_mean_values) == 0:
 					print '--> Detected problems with data on', channel
 					sys.exit(1)
@@ -275,35 +240,32 @@ def t_plots(t_decoder, T_histo_list, TEMP_DATA, STABLE_TEMP_MEAN_RISING, STABLE_
 		
 	else:
 		print ' --> problem with initialisation! '
-	
-	for hist in T_histo_list:
-		name = hist.GetName()
-		#print ' -> Removing zeros in histogram: ', '\033[91m' + name + '\033[0m'
-		nbins = hist.GetNbinsX()
-		non_empty = 0
-		found_non_empty = False
-		for bin in range(1, nbins):
-			temp = hist.GetBinContent(bin)
-			if ( temp < 0.0001 and temp > -0.0001 ):
-				hist.SetBinContent(bin, -199)
-		
-	
 
+def t_analysis(t_decoder, T_histo_list, TEMP_DATA, STABLE_TEMP_MEAN_RISING, STABLE_TEMP_MEAN_FALLING, STABLE_TEMP_MEAN, BAD_CHANNELS, hv_decoder, opts, semaph_file):
+	#Works as a target for a thread
+	t_plots(t_decoder, T_histo_list, opts, semaph_file)
+	temp_plateaus(t_decoder, TEMP_DATA, STABLE_TEMP_MEAN_RISING, STABLE_TEMP_MEAN_FALLING, STABLE_TEMP_MEAN, BAD_CHANNELS)
 
-def __process_and_plot__(opts):
+def decode_scan(opts):
     # -> get mapper object
-    czas = clock()
     path = opts['path']
     hv_mapperTemp = []
     hv_decoderTemp = []
     t_decoderTemp = []
+
+    # -> list the data folder and read the csv headers only once,
+    #    each decoder gets the files matching its signature
+    source = ScanSourceRouter(path)
+
+    # -> csv decoding is pure python work, the threads would be serialised
+    #    by the GIL, with more workers the files are decoded by processes
+    pool = None
+    if opts.get('workers', 1) > 1:
+        pool = Pool(opts['workers'])
     
-    semaph_main = Semaphore(MAX_THREADS) #main semaphore
-    semphr_syncText = Semaphore(1) #sempahore for synchronizing text output
-    semaph_file = Semaphore(1) #sempahore for synchronizing file access
     hvcm_thread = Thread(target=HVCMTarget, args=(hv_mapperTemp,))
-    hvcd_thread = Thread(target=HVCDTarget, args=(hv_decoderTemp, path))
-    tempd_thread = Thread(target=TempDTarget, args=(t_decoderTemp, path))
+    hvcd_thread = Thread(target=HVCDTarget, args=(hv_decoderTemp, path, source, opts, pool))
+    tempd_thread = Thread(target=TempDTarget, args=(t_decoderTemp, path, source, opts, pool))
     
     hvcm_thread.start()
     hvcd_thread.start()
@@ -312,68 +274,61 @@ def __process_and_plot__(opts):
     hvcm_thread.join()
     hvcd_thread.join()
     tempd_thread.join()
+    if pool != None:
+        pool.close()
+        pool.join()
     
-    hv_mapper = hv_mapperTemp[0]
-    hv_decoder = hv_decoderTemp[0]
-    t_decoder = t_decoderTemp[0]
-
-    hv_histo_list = {}
-    #Start hv plots thread 
-    hv_plotThread = Thread(target=hv_plots, args=(hv_decoder, hv_histo_list, hv_mapper, opts, semaph_file))
-    hv_plotThread.start()
+    return ( hv_mapperTemp[0], hv_decoderTemp[0], t_decoderTemp[0] )
 
-    T_histo_list = []
-    TEMP_DATA = {}
-    STABLE_TEMP_MEAN_RISING = {}
-    STABLE_TEMP_MEAN_FALLING = {}
-    STABLE_TEMP_MEAN = {}
-    
-    BAD_CHANNELS = ['PU02_AT']
-    
-    t_plotThread = Thread(target=t_plots, args=(t_decoder, T_histo_list, TEMP_DATA, STABLE_TEMP_MEAN_RISING, STABLE_TEMP_MEAN_FALLING, STABLE_TEMP_MEAN, BAD_CHANNELS, hv_decoder, opts, semaph_file))
-    t_plotThread.start()
-            
-    #better to join those threads
-    hv_plotThread.join()
-    t_plotThread.join()
-    
-    #write plots to file
-    date = hv_decoder.getTDate()
+@traced('write_scan_histos')
+def write_scan_histos(hv_histo_list, T_histo_list, date, opts):
+    # -> the analysis runs on the booked histograms, ROOT objects are
+    #    created only to draw and write them out
+    from ROOT import TCanvas, TFile
+    for histo in T_histo_list:
+        mark_gaps(histo, -199, 1, histo.GetNbinsX())
+    hv_root_histos = dict( (key, root_histo(hv_histo_list[key][HIST])) for key in hv_histo_list )
+    t_root_histos = [ root_histo(histo) for histo in T_histo_list ]
+    canvas_list = []
+    t_canvas_list = []
     
     if opts['plot']:
-		canvas_list = []
 		for canvas in range(6):
-			canvas_list.append(TCanvas('hvi_' + str(canvas), ' HV currents vs. time'))
+			canvas_list.append(TCanvas(scan_name(opts, 'hvi_' + str(canvas)), ' HV currents vs. time'))
 			canvas_list[canvas].Divide(4, 4)
 	
 		keys = hv_histo_list.keys()
 		for cnt, key in enumerate( sorted( keys ) ):
 			canvas_list[cnt/CANVAS_HISTO].cd(cnt%CANVAS_HISTO+1)
-			histo = hv_histo_list[key][HIST]
+			histo = hv_root_histos[key]
 			histo.GetYaxis().SetRangeUser(0., 0.25)
 			histo.Draw()
-		t_canvas_list = []
 		for canvas in range(6):
-			t_canvas_list.append(TCanvas('t_' + str(canvas), ' Temperatures vs. time'))
+			t_canvas_list.append(TCanvas(scan_name(opts, 't_' + str(canvas)), ' Temperatures vs. time'))
 			t_canvas_list[canvas].Divide(4, 4)
 		
-		for cnt, histo in enumerate(T_histo_list):
+		for cnt, histo in enumerate(t_root_histos):
 			t_canvas_list[cnt/CANVAS_HISTO].cd(cnt%CANVAS_HISTO+1)
 			histo.GetYaxis().SetRangeUser(-40., 0.)
 			histo.Draw()
 
-    f = TFile('hvi_temp_histos_' + date + '.root', 'recreate')
-    for key in sorted( hv_histo_list.keys() ):
-	histo = hv_histo_list[key][HIST]
+    f = TFile(scan_name(opts, 'hvi_temp_histos_' + date + '.root'), 'recreate')
+    for key in sorted( hv_root_histos.keys() ):
+	histo = hv_root_histos[key]
 	histo.GetYaxis().SetRangeUser(0., 0.25)
 	histo.Write()
 	
     #date = hv_decoder.getTDate() #dunno if second date is required but it was here before, check if works without this
-    for histo in T_histo_list:
+    for histo in t_root_histos:
         histo.GetYaxis().SetRangeUser(-40., 0.)
         histo.Write()
     f.Close
 
+    # -> the canvases have to outlive the call to stay on the screen
+    return ( [ hv_root_histos, t_root_histos, canvas_list, t_canvas_list ] )
+
+@traced('hv_window_means')
+def hv_window_means(hv_histo_list, hv_mapper, STABLE_TEMP_MEAN_RISING, BAD_CHANNELS):
     if DEB_2:
         for channel in sorted(STABLE_TEMP_MEAN_RISING):
             if channel == 'VL12_CT':
@@ -388,35 +343,34 @@ def __process_and_plot__(opts):
     # -> do it only for the rising edge of each scan
     HV_CURRENTS = {}
     hv_stable_points = []
-    mapper = HVChannelMapper()
+    mean_current = 0
+    mapper = hv_mapper
     for hv_channel in sorted(hv_histo_list):
-        hv_data_repo = hv_histo_list[hv_channel][HIST]
-        first_bin = hv_histo_list[hv_channel][FIRST_BIN]
-        temp_channel = mapper.HVChannel2Label(hv_channel)
-        if DEB_2:
-            if temp_channel == 'VL12_CT':
-                hv_data_repo.Draw()
-        if temp_channel not in BAD_CHANNELS:
-            if temp_channel in STABLE_TEMP_MEAN_RISING:
-                stable_temp_points = STABLE_TEMP_MEAN_RISING[temp_channel]
-                for stable_point in stable_temp_points:
-                    hv_currents_in_temp_range = []
-                    if int(stable_point[TEMP]) >= -30:
-                        time_range = stable_point[TIME]
-                        time_start = time_translator( time_range[FIRST] )
-                        time_end = time_translator( time_range[SECOND] )
-                        for bin in range(time_start, time_end):
-                            hv_current = hv_data_repo.GetBinContent( bin - first_bin )
-                            hv_currents_in_temp_range.append(hv_current)
-                        if len(hv_currents_in_temp_range):
-                            mean_current = 0
-                            for current in hv_currents_in_temp_range:
-                                mean_current += current
-                            mean_current /= len(hv_currents_in_temp_range)
-                        hv_stable_point = [time_range, round(mean_current, 5)]
-                        hv_stable_points.append(hv_stable_point)
-                HV_CURRENTS[temp_channel] = hv_stable_points
-                hv_stable_points = []
+        with TRACER.span('channel') as span:
+            hv_data_repo = hv_histo_list[hv_channel][HIST]
+            first_bin = hv_histo_list[hv_channel][FIRST_BIN]
+            temp_channel = mapper.HVChannel2Label(hv_channel)
+            if DEB_2:
+                if temp_channel == 'VL12_CT':
+                    root_histo(hv_data_repo).Draw()
+            if temp_channel not in BAD_CHANNELS:
+                if temp_channel in STABLE_TEMP_MEAN_RISING:
+                    # -> prefix sums over the whole histogram, built once per
+                    #    channel, give the mean of any time window in O(1)
+                    hv_window_stats = WindowStats(histo_contents(hv_data_repo))
+                    stable_temp_points = STABLE_TEMP_MEAN_RISING[temp_channel]
+                    for stable_point in stable_temp_points:
+                        if int(stable_point[TEMP]) >= -30:
+                            time_range = stable_point[TIME]
+                            time_start = time_range[FIRST]
+                            time_end = time_range[SECOND]
+                            if time_end > time_start:
+                                mean_current = hv_window_stats.getMean(time_start - first_bin, time_end - first_bin)
+                            hv_stable_point = [time_range, round(mean_current, 5)]
+                            hv_stable_points.append(hv_stable_point)
+                    span.count(windows = len(hv_stable_points))
+                    HV_CURRENTS[temp_channel] = hv_stable_points
+                    hv_stable_points = []
 
     if DEB_2:
         for channel in sorted(HV_CURRENTS):
@@ -425,29 +379,32 @@ def __process_and_plot__(opts):
                 for hv_point in hv_points:
                     print hv_point
 
+    return ( HV_CURRENTS )
+
+@traced('it_graph_data')
+def it_graph_data(HV_CURRENTS, STABLE_TEMP_MEAN_RISING):
+    # -> [i_hv values, temperatures] of each sensor, every i_hv taken once,
+    #    the plateaus are matched to the hv windows by their time range
     IT_GRAPH_TEMP_RISING_DATA = {}
-    f_it = TFile('IT_histos_' + date + '.root', 'recreate')
     for channel in sorted(HV_CURRENTS):
-        filtered_hv_values = []
-        filtered_t_values = []
-        IT_Graph_data = []
-        hv_points = HV_CURRENTS[channel]
-        stable_rising_temp_points = STABLE_TEMP_MEAN_RISING[channel]
-        for index, point in enumerate(hv_points):
-            if point[I_hv] not in filtered_hv_values:
-                filtered_hv_values.append( point[I_hv] )
-                corresponding_t = [ pt for pt in stable_rising_temp_points if pt[TIME] == point[TIME] ]
-                filtered_t_values.append( corresponding_t[FIRST][TEMP] )
-        IT_Graph_data.append( filtered_hv_values )
-        IT_Graph_data.append( filtered_t_values )
-        IT_GRAPH_TEMP_RISING_DATA[channel] = IT_Graph_data
+        IT_GRAPH_TEMP_RISING_DATA[channel] = join_time_ranges(HV_CURRENTS[channel], STABLE_TEMP_MEAN_RISING[channel])
+
+    return ( IT_GRAPH_TEMP_RISING_DATA )
+
+@traced('write_it_histos')
+def write_it_histos(IT_GRAPH_TEMP_RISING_DATA, date, opts = None):
+    from ROOT import TH1F, TFile
+    f_it = TFile(scan_name(opts, 'IT_histos_' + date + '.root'), 'recreate')
+    for channel in sorted(IT_GRAPH_TEMP_RISING_DATA):
+        filtered_hv_values = IT_GRAPH_TEMP_RISING_DATA[channel][FIRST]
+        filtered_t_values = IT_GRAPH_TEMP_RISING_DATA[channel][SECOND]
         title = 'IT histo for channel: ' + channel
         last_bin = filtered_t_values[FIRST] - 0.5
         first_bin = filtered_t_values[LAST] + 0.5
         n = len( filtered_t_values )
         if DEB_2:
             print 'last temp. bin: ', last_bin, ', first temp. bin: ', first_bin 
-        it_hist = TH1F(channel, title, (n + 1), last_bin,  first_bin)
+        it_hist = TH1F(scan_name(opts, channel), title, (n + 1), last_bin,  first_bin)
         for index, hv_value in enumerate(filtered_hv_values):
             it_hist.SetBinContent(index + 2, hv_value)
         it_hist.Write()        
@@ -457,105 +414,86 @@ def __process_and_plot__(opts):
 
     f_it.Close()
 
-    if DEB_2:
-        for channel in IT_GRAPHS_TEMP_RISING:
-            if channel == 'VL12_CT':
-                IT_points = IT_GRAPHS_TEMP_RISING[channel]
-                hv_points = IT_points[FIRST]
-                t_points = IT_points[SECOND]
-                for index, temp in enumerate(t_points):
-                    print 'point: ', index, 'temp: ', temp, 'i_hv: ', hv_points[index]
+@traced('filter_it_points')
+def filter_it_points(IT_GRAPH_TEMP_RISING_DATA, min_current = IT_MIN_CURRENT, max_drop = IT_MAX_DROP):
+    # -> [t, i_hv] arrays of the points that make each IT graph
+    IT_GRAPH_POINTS = {}
+    ############################################################
+    # -> first level of filtering to create IT graphs
+    #    if the next i_hv is lower than the current i_hv value
+    #    discard it and the rest of the data, all the sensors
+    #    at once
+    ############################################################
+    IT_CUTS = it_graph_cuts(IT_GRAPH_TEMP_RISING_DATA, min_current, max_drop)
+    for channel in sorted(IT_CUTS):
+        data_2_plot, f_t, f_hv = IT_CUTS[channel]
+        if DEB_2:
+           print 'filered points: ', data_2_plot, ', channel: ', channel, ', data size: ', len(f_hv)
+        # -> all the points if no problem was detected, otherwise the ones
+        #    before the drop (no graph if nothing is left)
+        if data_2_plot == len( f_hv ) or data_2_plot:
+            t = array( 'f', f_t[:data_2_plot].tolist() )
+            i_hv = array( 'f', f_hv[:data_2_plot].tolist() )
+            IT_GRAPH_POINTS[channel] = [ t, i_hv ]
 
+    return ( IT_GRAPH_POINTS )
+
+@traced('make_it_graphs')
+def make_it_graphs(IT_GRAPH_POINTS, opts = None):
+    from ROOT import TGraphErrors
     IT_GRAPHS = {}
-    data_2_plot = 0
-    IT_GRAPHS = {}
-    for channel in sorted(IT_GRAPH_TEMP_RISING_DATA):
-        ############################################################
-        # -> first level of filtering to create IT graphs
-        #    if the next i_hv is lower than the current i_hv value
-        #    discard it and the rest of the data
-        ############################################################
-        raw_hv = IT_GRAPH_TEMP_RISING_DATA[channel][FIRST]
-        raw_t = IT_GRAPH_TEMP_RISING_DATA[channel][SECOND]
-        # -> filtered arrays
-        f_hv = []
-        f_t = []
-        # -> remove very small leakage currents
-        for index, hv in enumerate( raw_hv ):
-            if abs( hv ) < 0.01:
-                continue
-            else:
-                f_hv.append( raw_hv[index] )
-                f_t.append( raw_t[index] )
-        for index, hv in enumerate( sorted( f_hv ) ):
-            if index < ( len( f_hv ) - 1 ):
-                if f_hv[index + 1] - f_hv[index] < 0:
-                    delta_percent = 100* abs( ( f_hv[index + 1] - f_hv[index] )/f_hv[index] )
-                    if delta_percent > 7.:
-                        data_2_plot = index
-                        break
-                    else:
-                        continue
-            else:
-                data_2_plot = index
+    for channel in sorted(IT_GRAPH_POINTS):
+        t, i_hv = IT_GRAPH_POINTS[channel]
+        data_2_plot = len( t )
         # -> for the moment only placeholders are present...
-        err_t = array( 'f', [ err_x * 0. for err_x in range( data_2_plot )] )
-        err_i_hv = array( 'f', [ err_x * 0. for err_x in range( data_2_plot )] )
-        if DEB_2:
-           print 'filered points: ', data_2_plot, ', channel: ', channel, ', data size: ', len(f_hv)
-        if data_2_plot == len( f_hv ):
-            # -> no problem detected, plot all points
-            t = array( 'f', f_t )
-            i_hv = array( 'f', f_hv )
-            gr = TGraphErrors( data_2_plot, t, i_hv, err_t, err_i_hv )
-            gr.SetTitle( 'IT graph for sensor: ' + channel )
-            gr_name = 'IT_' + channel
-            gr.SetName( gr_name )
-            gr.SetMarkerColor( 1 )
-            gr.SetMarkerStyle( 21 )
-            IT_GRAPHS[channel] = gr
-        else:
-            if data_2_plot:
-                # -> some of the points were removed
-                t = array( 'f', [ t for index, t in enumerate( f_t ) if index < data_2_plot ] )
-                i_hv = array( 'f', [ i_hv for index, i_hv in enumerate( f_hv ) if index < data_2_plot ] )
-                gr = TGraphErrors( data_2_plot, t, i_hv, err_t, err_i_hv )
-                gr.SetTitle( 'IT graph for sensor: ' + channel )
-                gr_name = 'IT_' + channel
-                gr.SetName( gr_name )
-                gr.SetMarkerColor( 1 )
-                gr.SetMarkerStyle( 21 )
-                IT_GRAPHS[channel] = gr
-        data_2_plot = 0
-    
-    czas2 = clock()
-    totaltime = czas2 - czas
-    print totaltime
+        err_t = array( 'f', [ 0. ] ) * data_2_plot
+        err_i_hv = array( 'f', [ 0. ] ) * data_2_plot
+        gr = TGraphErrors( data_2_plot, t, i_hv, err_t, err_i_hv )
+        gr.SetTitle( 'IT graph for sensor: ' + channel )
+        gr_name = scan_name(opts, 'IT_' + channel)
+        gr.SetName( gr_name )
+        gr.SetMarkerColor( 1 )
+        gr.SetMarkerStyle( 21 )
+        IT_GRAPHS[channel] = gr
+
+    return ( IT_GRAPHS )
+
+@traced('fit_it_graphs')
+def fit_it_graphs(IT_GRAPHS, IT_GRAPH_POINTS, opts):
     # -> FIT
-    from ROOT import Double
     FIT_LIBRARY = {}
     fit_engine = FitModel()
-    TMIN = Double(0.0)
-    TMAX = Double(0.0)
-    I_hv_MIN = Double(0.0)
-    I_hv_MAX = Double(0.0)
-    for channel in IT_GRAPHS:
-        IT_GRAPHS[channel].ComputeRange(TMIN, TMAX, I_hv_MIN, I_hv_MAX)
-        fit_engine.TMIN = TMIN
-        fit_engine.TMAX = TMAX
-        FIT_LIBRARY[channel] = fit_engine.prepare_fit('fit_' + channel)
-        IT_GRAPHS[channel].Fit(FIT_LIBRARY[channel], 'rmq')
-        if channel == 'VL05_CT':
-            IT_GRAPHS[channel].Draw('AZP')
-            FIT_LIBRARY[channel].Draw('SAME')
+    if opts.get('fit_engine', FIT_ENGINE) != 'root':
+        # -> all the sensors in one vectorised fit, each over its own t range
+        with TRACER.span('fit_batch') as span:
+            FIT_LIBRARY = fit_engine.fit_batch(IT_GRAPH_POINTS, prefix = scan_name(opts, 'fit_'))
+            span.count(fits = len(FIT_LIBRARY), iterations = sum([ fit.GetIterations() for fit in FIT_LIBRARY.values() ]))
+        # -> the graphs carry their fit function into IT_graphs_*.root,
+        #    as graph.Fit does for the root engine
+        for channel in sorted(FIT_LIBRARY):
+            if channel in IT_GRAPHS:
+                IT_GRAPHS[channel].GetListOfFunctions().Add(FIT_LIBRARY[channel].toROOT())
+    else:
+        from ROOT import Double
+        TMIN = Double(0.0)
+        TMAX = Double(0.0)
+        I_hv_MIN = Double(0.0)
+        I_hv_MAX = Double(0.0)
+        for channel in IT_GRAPHS:
+            IT_GRAPHS[channel].ComputeRange(TMIN, TMAX, I_hv_MIN, I_hv_MAX)
+            fit_engine.TMIN = TMIN
+            fit_engine.TMAX = TMAX
+            FIT_LIBRARY[channel] = fit_engine.prepare_fit(scan_name(opts, 'fit_' + channel))
+            IT_GRAPHS[channel].Fit(FIT_LIBRARY[channel], 'rmq')
 
-    
-    # --> keep the interpreter on...
-    rep = raw_input( 'Press ENTER to finish ' )
+    return ( FIT_LIBRARY )
 
+@traced('write_it_graphs')
+def write_it_graphs(IT_GRAPHS, date, opts = None):
+    from ROOT import TFile
     # -> order them - first A type then C ones, this creates a root file
     #    that contains filtered graphs with measured leakage current vs. temp
-    g_it = TFile('IT_graphs_' + date + '.root', 'recreate')
+    g_it = TFile(scan_name(opts, 'IT_graphs_' + date + '.root'), 'recreate')
     for channel in sorted( IT_GRAPHS ):
         if 'A' in channel:
             name = IT_GRAPHS[channel].GetName()
@@ -569,4 +507,154 @@ def __process_and_plot__(opts):
             IT_GRAPHS[channel].Write(name)
         else:
             continue
-    g_it.Close()            
+    g_it.Close()
+
+@traced('write_it_points')
+def write_it_points(IT_GRAPH_POINTS, FIT_LIBRARY, date, opts = None):
+    # -> the output of a scan without ROOT: the filtered IT points and the
+    #    fit parameters of every sensor, <channel>_t, <channel>_i_hv and
+    #    <channel>_fit arrays in one .npz file
+    arrays = {}
+    for channel in sorted( IT_GRAPH_POINTS ):
+        t, i_hv = IT_GRAPH_POINTS[channel]
+        arrays[channel + '_t'] = numpy.frombuffer(t, dtype = numpy.float32)
+        arrays[channel + '_i_hv'] = numpy.frombuffer(i_hv, dtype = numpy.float32)
+    for channel in sorted( FIT_LIBRARY ):
+        fit = FIT_LIBRARY[channel]
+        arrays[channel + '_fit'] = numpy.append(fit.GetParameters(), [ fit.GetXmin(), fit.GetXmax(), fit.GetChisquare(), fit.GetNDF() ])
+    numpy.savez(scan_name(opts, 'IT_points_' + date + '.npz'), **arrays)
+
+def run_scan(opts):
+    ''' All the stages of one scan up to the IT fits, without any user
+        interaction. Returns [date, IT graphs, fits, ROOT objects that
+        have to stay alive while they are drawn]. With opts['root_output']
+        False no ROOT object is made, the IT points and the fits are
+        written to IT_points_<date>.npz and the graphs are empty '''
+    root_output = opts.get('root_output', True)
+    czas = clock()
+    hv_mapper, hv_decoder, t_decoder = decode_scan(opts)
+    semaph_file = Semaphore(1) #sempahore for synchronizing file access
+
+    hv_histo_list = {}
+    #Start hv plots thread 
+    hv_plotThread = Thread(target=hv_plots, args=(hv_decoder, hv_histo_list, hv_mapper, opts, semaph_file))
+    hv_plotThread.start()
+
+    T_histo_list = []
+    TEMP_DATA = {}
+    STABLE_TEMP_MEAN_RISING = {}
+    STABLE_TEMP_MEAN_FALLING = {}
+    STABLE_TEMP_MEAN = {}
+    
+    BAD_CHANNELS = ['PU02_AT']
+    
+    t_plotThread = Thread(target=t_analysis, args=(t_decoder, T_histo_list, TEMP_DATA, STABLE_TEMP_MEAN_RISING, STABLE_TEMP_MEAN_FALLING, STABLE_TEMP_MEAN, BAD_CHANNELS, hv_decoder, opts, semaph_file))
+    t_plotThread.start()
+            
+    #better to join those threads
+    hv_plotThread.join()
+    t_plotThread.join()
+    
+    #write plots to file
+    date = hv_decoder.getTDate()
+    scan_plots = []
+    if root_output:
+        scan_plots = write_scan_histos(hv_histo_list, T_histo_list, date, opts)
+
+    HV_CURRENTS = hv_window_means(hv_histo_list, hv_mapper, STABLE_TEMP_MEAN_RISING, BAD_CHANNELS)
+
+    IT_GRAPH_TEMP_RISING_DATA = it_graph_data(HV_CURRENTS, STABLE_TEMP_MEAN_RISING)
+    if root_output:
+        write_it_histos(IT_GRAPH_TEMP_RISING_DATA, date, opts)
+
+    if DEB_2:
+        for channel in IT_GRAPHS_TEMP_RISING:
+            if channel == 'VL12_CT':
+                IT_points = IT_GRAPHS_TEMP_RISING[channel]
+                hv_points = IT_points[FIRST]
+                t_points = IT_points[SECOND]
+                for index, temp in enumerate(t_points):
+                    print 'point: ', index, 'temp: ', temp, 'i_hv: ', hv_points[index]
+
+    IT_GRAPH_POINTS = filter_it_points(IT_GRAPH_TEMP_RISING_DATA)
+    IT_GRAPHS = {}
+    if root_output:
+        IT_GRAPHS = make_it_graphs(IT_GRAPH_POINTS, opts)
+    
+    czas2 = clock()
+    totaltime = czas2 - czas
+    print totaltime
+    FIT_LIBRARY = fit_it_graphs(IT_GRAPHS, IT_GRAPH_POINTS, opts)
+    if not root_output:
+        write_it_points(IT_GRAPH_POINTS, FIT_LIBRARY, date, opts)
+
+    return ( [ date, IT_GRAPHS, FIT_LIBRARY, scan_plots ] )
+
+def __process_and_plot__(opts):
+    if opts.get('trace') != None:
+        TRACER.enable(opts['trace'], opts.get('trace_file'))
+    date, IT_GRAPHS, FIT_LIBRARY, scan_plots = run_scan(opts)
+    if opts.get('root_output', True):
+        for channel in IT_GRAPHS:
+            if channel == 'VL05_CT':
+                IT_GRAPHS[channel].Draw('AZP')
+                FIT_LIBRARY[channel].Draw('SAME')
+
+    
+        # --> keep the interpreter on...
+        rep = raw_input( 'Press ENTER to finish ' )
+
+        write_it_graphs(IT_GRAPHS, date, opts)
+    TRACER.finish()
+
+def __batch_job__(opts):
+    ''' Process pool target: runs one scan of a batch and writes all its
+        output, returns the status record of the scan '''
+    start = time.time()
+    record = { 'scan': opts['scan_tag'], 'path': opts['path'], 'status': FAILURE, 'date': '', 'graphs': 0, 'fits': 0, 'wall': 0., 'error': '' }
+    try:
+        date, IT_GRAPHS, FIT_LIBRARY, scan_plots = run_scan(opts)
+        if opts.get('root_output', True):
+            write_it_graphs(IT_GRAPHS, date, opts)
+        record['status'] = SUCCESS
+        record['date'] = date
+        record['graphs'] = len(IT_GRAPHS)
+        record['fits'] = len(FIT_LIBRARY)
+    except (Exception, SystemExit), err:
+        record['error'] = str(err) or err.__class__.__name__
+    record['wall'] = time.time() - start
+
+    return ( record )
+
+def process_batch(paths, opts):
+    ''' Runs the scans in paths on a pool of opts['jobs'] processes, each
+        scan in one process. ROOT (if the ROOT output is written) and the
+        channel map are loaded once here and shared by the forked workers,
+        every worker takes the next scan as soon as it is done. Returns the status records in paths order '''
+    if opts.get('root_output', True):
+        import ROOT
+    get_channel_map()
+    tags = set()
+    jobs = []
+    for path in paths:
+        # -> data folders with the same name get a running number, bumped
+        #    until the tag is not taken (a folder may be called x_2 itself)
+        base = scan_tag(path)
+        tag = base
+        number = 1
+        while tag in tags:
+            number += 1
+            tag = base + '_' + str(number)
+        tags.add(tag)
+        job = dict(opts)
+        job.update({ 'path': path, 'scan_tag': tag, 'plot': False, 'workers': 1, 'trace': None })
+        jobs.append(job)
+    records = {}
+    pool = Pool(max(min(opts['jobs'], len(jobs)), 1))
+    for record in pool.imap_unordered(__batch_job__, jobs):
+        print ' --> Scan ', record['scan'], ' done in %.1f s' % record['wall']
+        records[record['scan']] = record
+    pool.close()
+    pool.join()
+
+    return ( [ records[job['scan_tag']] for job in jobs ] )
@@ -12,9 +12,8 @@
 #
 ##########################################################################
 
-import os, sys
+import os, sys, time, glob
 from ITScanCore import *
-import ITScan
 
 def __help__():
     print ' ------------------------------------------------------------------------------- '
@@ -27,6 +26,22 @@ def __help__():
     print ' YOU CAN SPECIFY                                                               '
     print ' -q (--quiet) - do not plot transient histograms just write them out to a file '
     print ' -t (--time) - time when the scan was initiated (hh:mm:ss)                     '
+    print ' -n (--no-cache) - always decode the csv files, do not use the decoded cache    '
+    print ' -c (--cache-dir) - folder for the decoded cache (default: <path>/.itscan_cache)'
+    print ' -j (--jobs) - number of processes decoding the csv files (default: 1)          '
+    print ' -b (--backend) - histograms used by the analysis: numpy or root (default: numpy)'
+    print ' -f (--fit-engine) - IT curve fits: numpy or root (default: numpy)             '
+    print ' --trace=json|table - time every stage, json lines or a summary table       '
+    print ' --trace-file - where the trace goes (default: the screen)                     '
+    print ' -s (--status) - check the options and data files, report the decoded cache,  '
+    print '                 do not run the scan (ROOT is not needed)                      '
+    print ' --follow - follow the data files of a running scan and print the new IT       '
+    print '            points after each poll (ROOT is not needed), stop with Ctrl-C      '
+    print ' --interval - seconds between two polls in follow mode (default: 30)           '
+    print ' --polls - stop the follow mode after this many polls (default: 0, never)      '
+    print ' --batch - process many scans: give -p once per scan folder (or a glob, e.g.   '
+    print '           -p "data/ITscan_*"), -j scans run at a time (default: all cores),   '
+    print '           output names start with the scan folder name, nothing is drawn      '
     print ' -h (--help) - print this help                                                 '
     print ' ################################################################################ '
 
@@ -34,21 +49,15 @@ def __init__():
     print ' --> Initialisation '
     import getopt
     options = []
-    # -> check if we have LHCb and ROOT env set properly
-    try:
-       lhcb_env = os.environ['LHCBSYSROOT']
-       root_env = os.environ['ROOTSYS']
-    except KeyError:
-        print ' --> You need to set the minimal environment! '
-        print '     e.g. SetupProject LHCb ROOT              '
-        sys.exit(2)
 
     __path__ = str()
     __time__ = '00:00:00'
-    options = { 'path': '', 'plot': True, 'time': '' }
+    options = { 'path': '', 'plot': True, 'time': '', 'cache': True, 'cache_dir': None, 'workers': 1, 'histo_backend': HISTO_BACKEND, 'fit_engine': FIT_ENGINE, 'status': False,
+                'trace': None, 'trace_file': None, 'follow': False, 'interval': FOLLOW_INTERVAL, 'polls': 0,
+                'batch': False, 'paths': [], 'jobs': None, 'root_output': True }
    
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hp:qt:", ["help", "path=", "quiet", "time="])
+        opts, args = getopt.getopt(sys.argv[1:], "hp:qt:nc:j:b:f:s", ["help", "path=", "quiet", "time=", "no-cache", "cache-dir=", "jobs=", "backend=", "fit-engine=", "status", "trace=", "trace-file=", "follow", "interval=", "polls=", "batch"])
     except getopt.GetoptError, err:
         print str(err)
         __help__()
@@ -61,14 +70,65 @@ def __init__():
     for opt, arg in opts:
         if opt in ('-h', '--help'):
             __help__()
+            sys.exit(0)
         elif opt in ('-p', '--path'):
             __path__ = arg
             options['path'] = __path__
+            options['paths'].append(arg)
         elif opt in ('-q', '--quiet'):
             options['plot'] = False
         elif opt in ('-t', '--time'):
             __time__ = arg
             options['time'] = __time__
+        elif opt in ('-n', '--no-cache'):
+            options['cache'] = False
+        elif opt in ('-c', '--cache-dir'):
+            options['cache_dir'] = arg
+        elif opt in ('-j', '--jobs'):
+            if not arg.isdigit() or int(arg) < 1:
+                print ' --> The number of jobs must be a positive integer! '
+                __help__()
+                exit(2)
+            options['workers'] = int(arg)
+            options['jobs'] = int(arg)
+        elif opt in ('-b', '--backend'):
+            if arg not in HISTO_BACKENDS:
+                print ' --> Unknown histogram backend: ', arg
+                __help__()
+                exit(2)
+            options['histo_backend'] = arg
+        elif opt in ('-f', '--fit-engine'):
+            if arg not in FIT_ENGINES:
+                print ' --> Unknown fit engine: ', arg
+                __help__()
+                exit(2)
+            options['fit_engine'] = arg
+        elif opt == '--trace':
+            if arg not in TRACE_MODES:
+                print ' --> Unknown trace mode: ', arg
+                __help__()
+                exit(2)
+            options['trace'] = arg
+        elif opt == '--trace-file':
+            options['trace_file'] = arg
+        elif opt in ('-s', '--status'):
+            options['status'] = True
+        elif opt == '--follow':
+            options['follow'] = True
+        elif opt == '--interval':
+            if not arg.isdigit() or int(arg) < 1:
+                print ' --> The poll interval must be a positive number of seconds! '
+                __help__()
+                exit(2)
+            options['interval'] = int(arg)
+        elif opt == '--polls':
+            if not arg.isdigit():
+                print ' --> The number of polls must be a non-negative integer! '
+                __help__()
+                exit(2)
+            options['polls'] = int(arg)
+        elif opt == '--batch':
+            options['batch'] = True
         else:
             assert False, " --> Unknown option! "
             __help__()
@@ -76,6 +136,21 @@ def __init__():
            
     __except__ = [ None, 'None', '', '0', ' ' ]
     __time_ranges__ = [(0, 23), (0, 59), (0, 59)]
+    if options['batch']:
+        options['paths'] = __batch_paths__(options['paths'] + args)
+        if len(options['paths']) == 0:
+            print ' --> No scan folders found, check the -p options and try again! '
+            __help__()
+            exit(2)
+        print ' --> ', len(options['paths']), ' scans in the batch '
+        __path__ = options['paths'][0]
+        options['path'] = __path__
+        if options['jobs'] == None:
+            from multiprocessing import cpu_count
+            options['jobs'] = cpu_count()
+        if options['follow'] or options['status'] or options['trace'] != None:
+            print ' --> --follow, --status and --trace are not available in batch mode '
+            exit(2)
     if __path__ in __except__:
          print " --> You must specify the path to the data files "
          exit(2)
@@ -105,14 +180,106 @@ def __init__():
                 if int(time_fragments[index]) not in range(time_range[0], time_range[1]):
                     print ' --> Check the time you give! It looks odd..., terminate! '
                     exit(2)
+
+    if options['status']:
+        sys.exit(__status__(options))
+
+    if options['follow']:
+        sys.exit(__follow__(options))
+
+    # -> check if we have LHCb and ROOT env set properly, only the ROOT
+    #    output needs it, the numpy backend and fit engine run without it
+    options['root_output'] = check_root_env()
+    if not options['root_output']:
+        if options['histo_backend'] == 'root' or options['fit_engine'] == 'root':
+            print ' --> You need to set the minimal environment! '
+            print '     e.g. SetupProject LHCb ROOT              '
+            sys.exit(2)
+        print ' --> No ROOT environment, the IT points and fits go to .npz files '
             
     return ( options )
 
+def __batch_paths__(patterns):
+    ''' Scan folders of the batch, each pattern is a folder or a glob,
+        a folder given twice is processed once '''
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [ pattern ]:
+            path = os.path.normpath(path)
+            if not os.path.isdir(path):
+                print ' --> Not a scan folder, skipped: ', path
+            elif path not in paths:
+                paths.append(path)
+    return ( paths )
+
+def __batch_report__(records):
+    ''' Prints the combined status of the scans of a batch, returns the
+        exit code (0 if every scan went through) '''
+    print ' ------------------------------------------------------------------------------- '
+    print ' %-30s %-7s %-19s %6s %5s %8s' % ('scan', 'status', 'date', 'graphs', 'fits', 'wall [s]')
+    failed = 0
+    for record in records:
+        status = 'OK' if record['status'] == SUCCESS else 'FAILED'
+        print ' %-30s %-7s %-19s %6d %5d %8.1f' % (record['scan'], status, record['date'], record['graphs'], record['fits'], record['wall'])
+        if record['status'] != SUCCESS:
+            failed += 1
+            print '     --> ', record['error']
+    print ' ------------------------------------------------------------------------------- '
+    print ' --> ', len(records), ' scans processed, ', failed, ' failed '
+    return ( 1 if failed else 0 )
+
+def __status__(options):
+    ''' Reports the data files found for each decoder and whether their
+        decoded data is cached, returns the exit code (0 if all found) '''
+    source = ScanSourceRouter(options['path'])
+    if source.getStatus() != SUCCESS:
+        return ( 1 )
+    cache = DecodedScanCache(options['path'], options['cache_dir'])
+    exit_code = 0
+    for decoder in ( HVCurrentDecoder, TemperatureDecoder ):
+        class_id = decoder.__name__
+        sources = source.getSources(decoder.__signature__)
+        if len(sources) == 0:
+            print ' --> ', class_id, ': no data files found! '
+            exit_code = 1
+            continue
+        cached = 'cached' if cache.hasEntry(class_id, sources) else 'not cached'
+        print ' --> ', class_id, ': ', len(sources), ' data files, decoded data ', cached
+    print ' --> Decoded cache folder: ', cache.getCacheDir()
+    return ( exit_code )
+
+def __follow__(options):
+    ''' Polls the data files of a running scan, prints the latest IT point
+        of the rising edge (the one the analysis fits) of each sensor that
+        got new points, returns the exit code '''
+    follower = ScanFollower(options['path'], bad_channels = ['PU02_AT'])
+    if follower.getStatus() != SUCCESS:
+        return ( 1 )
+    print ' --> Following the scan in: ', options['path'], ' every ', options['interval'], ' s '
+    polls = 0
+    try:
+        while True:
+            for label in follower.poll():
+                points = follower.getRising(label)
+                time_range, temp, i_hv = points[LAST_ENTRY]
+                print ' --> %s: %3d IT points, last T = %7.2f C, i_hv = %8.5f mA' % (label, len(points), temp, i_hv)
+            polls += 1
+            if options['polls'] and polls >= options['polls']:
+                break
+            time.sleep(options['interval'])
+    except KeyboardInterrupt:
+        print ' --> Follow mode stopped '
+    print ' --> Followed ', len(follower.getFiles()), ' data files, ', len(follower.getLabels()), ' sensors with IT points '
+    return ( 0 )
+
 # ----------
 # -- MAIN --
 # ----------
 if __name__ == '__main__':
     opts = __init__()
+    import ITScan
+    if opts['batch']:
+        sys.exit(__batch_report__(ITScan.process_batch(opts['paths'], opts)))
     ITScan.__process_and_plot__(opts)
     # -> wait before you exit
     if opts['plot']:
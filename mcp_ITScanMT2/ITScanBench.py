@@ -0,0 +1,341 @@
+##########################################################################
+#
+# --> Benchmark of the IT scan pipeline, every stage is timed on its
+#     own on the bundled 200V scan (or any other scan folder)
+#
+# Reports wall time, cpu time and peak memory of each stage, writes
+# the results as json and compares them with a stored baseline
+#
+# The cpu time of a stage is the one of this process plus the one of the
+# processes it runs: with -j N each decode stage starts its own pool and
+# joins it before the counters are read, only reaped workers are counted
+# by os.times. peak_rss_kb is the peak of this process, worker_peak_rss_kb
+# the peak of the largest worker joined so far
+#
+##########################################################################
+
+import os, sys
+import json
+import time
+import shutil
+import tempfile
+import resource
+import platform
+from ITScanCore import *
+import ITScan
+
+BENCH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ITscan_21Feb_2013_200V')
+BENCH_OUTPUT = 'itscan_bench.json'
+BENCH_BASELINE = 'itscan_bench_baseline.json'
+BENCH_REPEATS = 3
+BENCH_TOLERANCE = 0.10 # relative wall time increase reported as a regression
+BENCH_MIN_DELTA = 0.005 # s, smaller increases are timer noise
+BENCH_VERSION = 2
+
+def __help__():
+    print ' ------------------------------------------------------------------------------- '
+    print ' --> Benchmark of the IT scan stages                                            '
+    print ' -p (--path) - scan folder (default: data/ITscan_21Feb_2013_200V)               '
+    print ' -r (--repeats) - number of runs, the median is reported (default: 3)          '
+    print ' -o (--output) - json file with the results (default: itscan_bench.json)       '
+    print ' -b (--baseline) - json file to compare with (default: itscan_bench_baseline.json)'
+    print ' -s (--save-baseline) - store the results as the new baseline                  '
+    print ' -t (--tolerance) - wall time increase counted as regression (default: 0.10)   '
+    print ' -j (--jobs) - number of processes decoding the csv files (default: 1)          '
+    print ' -f (--fit-engine) - numpy or root (default: numpy)                            '
+    print ' -v (--verbose) - keep the printout of the pipeline                            '
+    print ' -h (--help) - print this help                                                 '
+    print ' ################################################################################ '
+
+# -------------
+# -- STAGES ---
+# -------------
+# -> each stage takes the state left by the previous ones and returns
+#    the item counts worth reporting
+
+def __directory_scan__(state, opts):
+    state['source'] = ScanSourceRouter(opts['path'])
+    # -> the routed data files, the folder also holds the decoded cache
+    sources = state['source'].getSources(HVI_SIGNATURE) + state['source'].getSources(TEMP_SIGNATURE)
+    return ( { 'files': len(sources) } )
+
+def __series_size__(decoder):
+    columns = decoder.getColumns()
+    channels = columns.getChannels()
+    return ( { 'channels': len(channels), 'rows': sum([ len(columns.getTime(channel)) for channel in channels ]) } )
+
+def __decode__(decoder, opts, source):
+    # -> the pool lives only inside the stage, its workers are reaped
+    #    before the stage ends so their cpu time is counted
+    pool = None
+    if opts['workers'] > 1:
+        from multiprocessing import Pool
+        pool = Pool(opts['workers'])
+    try:
+        return ( decoder(opts['path'], source = source, cache = False, pool = pool) )
+    finally:
+        if pool != None:
+            pool.close()
+            pool.join()
+
+def __hv_decode__(state, opts):
+    state['hv_decoder'] = __decode__(HVCurrentDecoder, opts, state['source'])
+    return ( __series_size__(state['hv_decoder']) )
+
+def __temp_decode__(state, opts):
+    state['t_decoder'] = __decode__(TemperatureDecoder, opts, state['source'])
+    return ( __series_size__(state['t_decoder']) )
+
+def __histogram_build__(state, opts):
+    state['hv_mapper'] = HVChannelMapper()
+    state['hv_histo_list'] = {}
+    state['T_histo_list'] = []
+    ITScan.hv_plots(state['hv_decoder'], state['hv_histo_list'], state['hv_mapper'], opts, None)
+    ITScan.t_plots(state['t_decoder'], state['T_histo_list'], opts, None)
+    return ( { 'histograms': len(state['hv_histo_list']) + len(state['T_histo_list']) } )
+
+def __plateau_finding__(state, opts):
+    state['TEMP_DATA'] = {}
+    state['STABLE_TEMP_MEAN_RISING'] = {}
+    ITScan.temp_plateaus(state['t_decoder'], state['TEMP_DATA'], state['STABLE_TEMP_MEAN_RISING'], {}, {}, opts['bad_channels'])
+    plateaus = sum([ len(runs) for runs in state['TEMP_DATA'].values() ])
+    stable = sum([ len(points) for points in state['STABLE_TEMP_MEAN_RISING'].values() ])
+    return ( { 'plateaus': plateaus, 'stable_rising': stable } )
+
+def __hv_window_means__(state, opts):
+    state['HV_CURRENTS'] = ITScan.hv_window_means(state['hv_histo_list'], state['hv_mapper'],
+                                                  state['STABLE_TEMP_MEAN_RISING'], opts['bad_channels'])
+    return ( { 'windows': sum([ len(points) for points in state['HV_CURRENTS'].values() ]) } )
+
+def __it_graph_filtering__(state, opts):
+    state['IT_DATA'] = ITScan.it_graph_data(state['HV_CURRENTS'], state['STABLE_TEMP_MEAN_RISING'])
+    state['IT_GRAPH_POINTS'] = ITScan.filter_it_points(state['IT_DATA'])
+    return ( { 'graphs': len(state['IT_GRAPH_POINTS']),
+               'points': sum([ len(points[0]) for points in state['IT_GRAPH_POINTS'].values() ]) } )
+
+def __fitting__(state, opts):
+    # -> the root engine fits TGraphErrors, building them is part of the stage
+    graphs = {}
+    if opts['fit_engine'] == 'root':
+        graphs = ITScan.make_it_graphs(state['IT_GRAPH_POINTS'])
+    state['FIT_LIBRARY'] = ITScan.fit_it_graphs(graphs, state['IT_GRAPH_POINTS'], opts)
+    return ( { 'fits': len(state['FIT_LIBRARY']) } )
+
+def __root_writing__(state, opts):
+    # -> all the ROOT files of a scan, written to a scratch folder
+    try:
+        import ROOT
+    except ImportError:
+        return ( None )
+    here = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix = 'itscan_bench_')
+    try:
+        os.chdir(scratch)
+        date = state['hv_decoder'].getTDate()
+        ITScan.write_scan_histos(state['hv_histo_list'], state['T_histo_list'], date, opts)
+        ITScan.write_it_histos(state['IT_DATA'], date)
+        ITScan.write_it_graphs(ITScan.make_it_graphs(state['IT_GRAPH_POINTS']), date)
+        written = sum([ os.path.getsize(os.path.join(scratch, name)) for name in os.listdir(scratch) ])
+    finally:
+        os.chdir(here)
+        shutil.rmtree(scratch, ignore_errors = True)
+    return ( { 'bytes': written } )
+
+BENCH_STAGES = [
+    ( 'directory_scan',     __directory_scan__ )
+   ,( 'hv_decode',          __hv_decode__ )
+   ,( 'temp_decode',        __temp_decode__ )
+   ,( 'histogram_build',    __histogram_build__ )
+   ,( 'plateau_finding',    __plateau_finding__ )
+   ,( 'hv_window_means',    __hv_window_means__ )
+   ,( 'it_graph_filtering', __it_graph_filtering__ )
+   ,( 'fitting',            __fitting__ )
+   ,( 'root_writing',       __root_writing__ )
+]
+
+# -----------------
+# -- MEASUREMENT --
+# -----------------
+def __cpu_time__():
+    times = os.times()
+    return ( times[0] + times[1] + times[2] + times[3] )
+
+def __peak_rss_kb__(who = resource.RUSAGE_SELF):
+    # -> ru_maxrss is in kB on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return ( peak )
+
+def __measure__(stage, state, opts):
+    ''' Runs one stage, returns its wall/cpu time, peak memory and items,
+        None if the stage cannot run here '''
+    stdout = sys.stdout
+    if not opts['verbose']:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        peak_before = __peak_rss_kb__()
+        cpu_start = __cpu_time__()
+        wall_start = time.time()
+        items = stage(state, opts)
+        wall = time.time() - wall_start
+        cpu = __cpu_time__() - cpu_start
+        peak = __peak_rss_kb__()
+        worker_peak = __peak_rss_kb__(resource.RUSAGE_CHILDREN)
+    finally:
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+    if items == None:
+        return ( None )
+    return ( { 'wall': wall, 'cpu': cpu, 'peak_rss_kb': peak, 'peak_growth_kb': peak - peak_before,
+               'worker_peak_rss_kb': worker_peak, 'items': items } )
+
+def __median__(values):
+    values = sorted(values)
+    middle = len(values) / 2
+    if len(values) % 2:
+        return ( values[middle] )
+    return ( 0.5 * ( values[middle - 1] + values[middle] ) )
+
+def run_benchmark(opts):
+    ''' Runs the whole pipeline opts['repeats'] times stage by stage,
+        returns the results with the median wall and cpu time per stage '''
+    runs = dict( (name, []) for name, stage in BENCH_STAGES )
+    for repeat in range(opts['repeats']):
+        state = {}
+        for name, stage in BENCH_STAGES:
+            runs[name].append(__measure__(stage, state, opts))
+
+    stages = {}
+    for name, stage in BENCH_STAGES:
+        measured = [ run for run in runs[name] if run != None ]
+        if len(measured) == 0:
+            stages[name] = { 'skipped': True }
+            continue
+        stages[name] = {
+            'wall'           : __median__([ run['wall'] for run in measured ])
+           ,'wall_min'       : min([ run['wall'] for run in measured ])
+           ,'cpu'            : __median__([ run['cpu'] for run in measured ])
+           ,'peak_rss_kb'    : max([ run['peak_rss_kb'] for run in measured ])
+           ,'peak_growth_kb' : max([ run['peak_growth_kb'] for run in measured ])
+           ,'worker_peak_rss_kb' : max([ run['worker_peak_rss_kb'] for run in measured ])
+           ,'items'          : measured[-1]['items']
+        }
+    return ( {
+        'version'     : BENCH_VERSION
+       ,'scan'        : os.path.basename(os.path.normpath(opts['path']))
+       ,'repeats'     : opts['repeats']
+       ,'workers'     : opts['workers']
+       ,'fit_engine'  : opts['fit_engine']
+       ,'python'      : platform.python_version()
+       ,'numpy'       : numpy.__version__
+       ,'host'        : platform.node()
+       ,'date'        : time.strftime('%Y-%m-%d %H:%M:%S')
+       ,'stages'      : stages
+    } )
+
+def compare(results, baseline, tolerance = BENCH_TOLERANCE):
+    ''' Adds the wall time ratio to the baseline to each stage, returns the
+        names of the stages slower than the baseline by more than tolerance
+        (and by more than BENCH_MIN_DELTA seconds) '''
+    regressions = []
+    for name, stage in BENCH_STAGES:
+        current = results['stages'].get(name, {})
+        reference = baseline.get('stages', {}).get(name, {})
+        if current.get('skipped') or reference.get('skipped') or 'wall' not in reference or 'wall' not in current:
+            continue
+        ratio = current['wall'] / max(reference['wall'], 1e-9)
+        current['baseline_wall'] = reference['wall']
+        current['ratio'] = ratio
+        if ratio > 1. + tolerance and current['wall'] - reference['wall'] > BENCH_MIN_DELTA:
+            regressions.append(name)
+    results['regressions'] = regressions
+    return ( regressions )
+
+def print_table(results):
+    print ' %-20s %10s %10s %10s %12s %8s   %s' % ('stage', 'wall [s]', 'cpu [s]', 'peak [MB]', 'baseline [s]', 'ratio', 'items')
+    for name, stage in BENCH_STAGES:
+        current = results['stages'][name]
+        if current.get('skipped'):
+            print ' %-20s %10s' % (name, 'skipped')
+            continue
+        baseline = ratio = '-'
+        if 'ratio' in current:
+            baseline = '%.4f' % current['baseline_wall']
+            ratio = '%.2f' % current['ratio']
+            if name in results.get('regressions', []):
+                ratio += ' !'
+        items = ', '.join([ '%s=%s' % (key, current['items'][key]) for key in sorted(current['items']) ])
+        print ' %-20s %10.4f %10.4f %10.1f %12s %8s   %s' % (name, current['wall'], current['cpu'],
+                                                            current['peak_rss_kb'] / 1024., baseline, ratio, items)
+
+def __init__():
+    import getopt
+    options = { 'path': BENCH_PATH, 'repeats': BENCH_REPEATS, 'output': BENCH_OUTPUT, 'baseline': BENCH_BASELINE,
+                'save_baseline': False, 'tolerance': BENCH_TOLERANCE, 'workers': 1, 'fit_engine': FIT_ENGINE,
+                'verbose': False, 'plot': False, 'histo_backend': HISTO_BACKEND, 'bad_channels': ['PU02_AT'] }
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hp:r:o:b:st:j:f:v", ["help", "path=", "repeats=", "output=", "baseline=",
+                                   "save-baseline", "tolerance=", "jobs=", "fit-engine=", "verbose"])
+    except getopt.GetoptError, err:
+        print str(err)
+        __help__()
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            __help__()
+            sys.exit(0)
+        elif opt in ('-p', '--path'):
+            options['path'] = arg
+        elif opt in ('-r', '--repeats'):
+            if not arg.isdigit() or int(arg) < 1:
+                print ' --> The number of repeats must be a positive integer! '
+                sys.exit(2)
+            options['repeats'] = int(arg)
+        elif opt in ('-o', '--output'):
+            options['output'] = arg
+        elif opt in ('-b', '--baseline'):
+            options['baseline'] = arg
+        elif opt in ('-s', '--save-baseline'):
+            options['save_baseline'] = True
+        elif opt in ('-t', '--tolerance'):
+            options['tolerance'] = float(arg)
+        elif opt in ('-j', '--jobs'):
+            if not arg.isdigit() or int(arg) < 1:
+                print ' --> The number of jobs must be a positive integer! '
+                sys.exit(2)
+            options['workers'] = int(arg)
+        elif opt in ('-f', '--fit-engine'):
+            if arg not in FIT_ENGINES:
+                print ' --> Unknown fit engine: ', arg
+                sys.exit(2)
+            options['fit_engine'] = arg
+        elif opt in ('-v', '--verbose'):
+            options['verbose'] = True
+
+    if not os.path.isdir(options['path']):
+        print ' --> You gave wrong path: ', options['path']
+        sys.exit(2)
+    return ( options )
+
+# ----------
+# -- MAIN --
+# ----------
+if __name__ == '__main__':
+    opts = __init__()
+    print ' --> Benchmarking ', opts['path'], ' (', opts['repeats'], ' runs)'
+    results = run_benchmark(opts)
+    regressions = []
+    if os.path.exists(opts['baseline']) and not opts['save_baseline']:
+        regressions = compare(results, json.load(open(opts['baseline'])), opts['tolerance'])
+    print_table(results)
+    json.dump(results, open(opts['output'], 'w'), indent = 1, sort_keys = True)
+    print ' --> Results written to ', opts['output']
+    if opts['save_baseline']:
+        json.dump(results, open(opts['baseline'], 'w'), indent = 1, sort_keys = True)
+        print ' --> Baseline stored in ', opts['baseline']
+    if len(regressions):
+        print ' --> Slower than the baseline: ', ', '.join(regressions)
+        sys.exit(1)
@@ -12,8 +12,18 @@
 
 import sys, os
 import csv
+import threading
+import calendar
+import hashlib
+import shutil
+import json
+import time
+import bisect
+import resource
+import numpy
+from array import array
+from itertools import izip
 from math import fabs
-from ROOT import TH1F, kFALSE, TProfile
 
 # -> definitions -----------------
 SUCCESS = 1
@@ -22,11 +32,23 @@ FAILURE = 0
 LABEL = 0
 SENSOR = 1
 #
+MAP_LABEL = 0
+MAP_HV_CHANNEL = 1
+MAP_SENSOR = 2
+MAP_Z = 3
+MAP_TYPE = 4
+CHANNEL_MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'VeloChannelMap.csv')
+#
 HEADER = 2
 TEMP_SIGNATURE = 'VEDCSHV'
 HVI_SIGNATURE  = 'VEHV'
 NULL_ENTRIES = ['', '0', 'nan']
 #
+DECODER_VERSION = 2
+CACHE_FOLDER = '.itscan_cache'
+CACHE_TAIL_BLOCK = 4096 # bytes at the end of each csv file hashed into the cache key
+DECODE_CHUNK_SIZE = 1 << 20 # bytes of csv decoded by one parallel task
+#
 HOUR = 3600
 MINUTE = 60
 #
@@ -46,8 +68,607 @@ TIME_INTERVAL = 1
 TEMP_BIN_OFFSET = 2 # centigrade
 I_HV_MIN = 0.
 I_HV_MAX = 0.5
+#
+HISTO_BACKEND = 'numpy'
+#
+FIT_ENGINE = 'numpy'
+FIT_ENGINES = ('numpy', 'root')
+FIT_PAR_NAMES = ('A', 'B', 'E_{g}')
+BOLTZMANN = 8.6e-5 # eV/K
+ZERO_CELSIUS = 273.15
+E_G_START = 1.21 # eV, starting value of the band gap in the fits
+#
+TRACE_MODES = ('json', 'table')
+#
+IT_MIN_CURRENT = 0.01 # mA, smaller leakage currents are left out of the IT graphs
+IT_MAX_DROP = 7. # percent, a bigger drop of the current ends an IT graph
+#
+FOLLOW_INTERVAL = 30 # seconds between two polls of the growing data files
+FOLLOW_MIN_TEMP = -30 # centigrade, colder plateaus give no IT point
 # ---------------------------------
 
+#
+class NullSpan():
+    """ span handed out while the tracing is off, does nothing """
+
+    def __enter__(self):
+        return ( self )
+
+    def __exit__(self, kind, value, traceback):
+        return ( False )
+
+    def count(self, **items):
+        pass
+
+NULL_SPAN = NullSpan()
+
+#
+class TraceSpan():
+    """ ---------------------------------------------------------------- """
+    """  One timed stage (with statement), records the wall time, the     """
+    """  change of the resident memory and the items counted inside       """
+    """ ---------------------------------------------------------------- """
+
+    def __init__(self, tracer, name, items):
+        self.__members__ = {
+            'class_id'          : 'TraceSpan'
+           ,'__tracer__'        : tracer
+           ,'__name__'          : name
+           ,'__path__'          : name
+           ,'__ITEMS__'         : items
+           ,'__start__'         : None
+           ,'__rss_kb__'        : None
+        }
+
+    # -> add to the item counts (rows, channels, plateaus...)
+    def count(self, **items):
+        counts = self.__members__['__ITEMS__']
+        for item in items:
+            counts[item] = counts.get(item, 0) + items[item]
+
+    def __enter__(self):
+        self.__members__['__path__'] = self.__members__['__tracer__'].push(self.__members__['__name__'])
+        self.__members__['__rss_kb__'] = current_rss_kb()
+        self.__members__['__start__'] = time.time()
+        return ( self )
+
+    def __exit__(self, kind, value, traceback):
+        duration = time.time() - self.__members__['__start__']
+        rss_kb = current_rss_kb()
+        tracer = self.__members__['__tracer__']
+        tracer.pop()
+        record = {
+            'span'          : self.__members__['__name__']
+           ,'path'          : self.__members__['__path__']
+           ,'thread'        : threading.current_thread().name
+           ,'start'         : round(self.__members__['__start__'] - tracer.getOrigin(), 6)
+           ,'duration'      : round(duration, 6)
+           ,'rss_kb'        : rss_kb
+           ,'rss_delta_kb'  : rss_kb - self.__members__['__rss_kb__']
+           ,'items'         : self.__members__['__ITEMS__']
+        }
+        if kind != None:
+            record['error'] = kind.__name__
+        tracer.record(record)
+        return ( False )
+
+#
+class StageTracer():
+    """ ---------------------------------------------------------------- """
+    """  Named spans around the stages of the scan, nested per thread.    """
+    """  Off by default: span() then returns NULL_SPAN and costs a call.  """
+    """  'json' mode writes one json line per finished span, 'table'      """
+    """  mode prints a summary per span path from finish()                """
+    """ ---------------------------------------------------------------- """
+
+    def __init__(self):
+        self.__members__ = {
+            'class_id'          : 'StageTracer'
+           ,'__mode__'          : None
+           ,'__stream__'        : None
+           ,'__own_stream__'    : False
+           ,'__origin__'        : time.time()
+           ,'__RECORDS__'       : [ ]
+           ,'__LOCK__'          : threading.Lock()
+           ,'__LOCAL__'         : threading.local()
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__mode__'          : """ None (off), 'json' or 'table' """
+           ,'__stream__'        : """ where the json lines or the table go """
+           ,'__RECORDS__'       : """ finished spans, in the order they ended """
+           ,'__LOCAL__'         : """ stack of the open span names of each thread """
+        }
+
+    def getName(self):
+        return ( self.__members__['class_id'] )
+
+    def isEnabled(self):
+        return ( self.__members__['__mode__'] != None )
+
+    def getOrigin(self):
+        return ( self.__members__['__origin__'] )
+
+    def getRecords(self):
+        return ( list(self.__members__['__RECORDS__']) )
+
+    # -> switch the tracing on, output goes to a file name, an open file
+    #    or stdout
+    def enable(self, mode = 'table', output = None):
+        if mode not in TRACE_MODES:
+            raise ValueError(' --> Unknown trace mode: ' + str(mode))
+        self.finish()
+        self.__members__['__mode__'] = mode
+        self.__members__['__origin__'] = time.time()
+        self.__members__['__RECORDS__'] = []
+        if isinstance(output, basestring):
+            self.__members__['__stream__'] = open(output, 'w')
+            self.__members__['__own_stream__'] = True
+        else:
+            self.__members__['__stream__'] = output
+            self.__members__['__own_stream__'] = False
+
+    def span(self, name, **items):
+        if self.__members__['__mode__'] == None:
+            return ( NULL_SPAN )
+        return ( TraceSpan(self, name, items) )
+
+    def push(self, name):
+        local = self.__members__['__LOCAL__']
+        if not hasattr(local, 'stack'):
+            local.stack = []
+        local.stack.append(name)
+        return ( '/'.join(local.stack) )
+
+    def pop(self):
+        self.__members__['__LOCAL__'].stack.pop()
+
+    def record(self, record):
+        self.__members__['__LOCK__'].acquire()
+        try:
+            self.__members__['__RECORDS__'].append(record)
+            if self.__members__['__mode__'] == 'json':
+                stream = self.__members__['__stream__'] or sys.stdout
+                stream.write(json.dumps(record, sort_keys = True) + '\n')
+                stream.flush()
+        finally:
+            self.__members__['__LOCK__'].release()
+
+    # -> calls, total/mean/max time, memory change and summed items per span path
+    def summary(self):
+        rows = {}
+        order = []
+        for record in sorted(self.__members__['__RECORDS__'], key = lambda record: record['start']):
+            path = record['path']
+            if path not in rows:
+                rows[path] = { 'path': path, 'calls': 0, 'total': 0., 'max': 0., 'rss_delta_kb': 0, 'items': {} }
+                order.append(path)
+            row = rows[path]
+            row['calls'] += 1
+            row['total'] += record['duration']
+            row['max'] = max(row['max'], record['duration'])
+            row['rss_delta_kb'] += record['rss_delta_kb']
+            for item in record['items']:
+                row['items'][item] = row['items'].get(item, 0) + record['items'][item]
+        for path in order:
+            rows[path]['mean'] = rows[path]['total'] / rows[path]['calls']
+        return ( [ rows[path] for path in order ] )
+
+    def printSummary(self, stream = None):
+        stream = stream or sys.stdout
+        stream.write(' %-48s %7s %10s %10s %10s %10s   %s\n' % ('span', 'calls', 'total [s]', 'mean [s]', 'max [s]', 'rss [MB]', 'items'))
+        for row in self.summary():
+            items = ', '.join([ '%s=%s' % (item, row['items'][item]) for item in sorted(row['items']) ])
+            stream.write(' %-48s %7d %10.4f %10.4f %10.4f %10.1f   %s\n' % (row['path'], row['calls'], row['total'], row['mean'],
+                                                                        row['max'], row['rss_delta_kb'] / 1024., items))
+
+    # -> print the table (table mode), close the output and switch off
+    def finish(self):
+        if self.__members__['__mode__'] == 'table':
+            self.printSummary(self.__members__['__stream__'])
+        if self.__members__['__own_stream__']:
+            self.__members__['__stream__'].close()
+        self.__members__['__mode__'] = None
+        self.__members__['__stream__'] = None
+        self.__members__['__own_stream__'] = False
+
+# -> the tracer shared by ITScan and ITScanCore
+TRACER = StageTracer()
+
+#
+def traced(name):
+    ''' Decorator running the function inside the TRACER span name '''
+    def __decorate__(function):
+        def __traced__(*args, **kwargs):
+            if not TRACER.isEnabled():
+                return ( function(*args, **kwargs) )
+            with TRACER.span(name):
+                return ( function(*args, **kwargs) )
+        __traced__.__name__ = function.__name__
+        __traced__.__doc__ = function.__doc__
+        return ( __traced__ )
+    return ( __decorate__ )
+
+#
+def current_rss_kb():
+    ''' Resident memory of the process in kB, the peak one where /proc is missing '''
+    try:
+        statm = open('/proc/self/statm')
+        try:
+            return ( int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 )
+        finally:
+            statm.close()
+    except (IOError, OSError, ValueError):
+        return ( resource.getrusage(resource.RUSAGE_SELF).ru_maxrss )
+
+#
+def __scan_signature__(head_1):
+    ''' The signature found in the first header row of a data file,
+        None if the file is not understood by any of the decoders '''
+    for entry in head_1:
+        if entry != '':
+            fragments = entry.split(':')
+            for signature in ( HVI_SIGNATURE, TEMP_SIGNATURE ):
+                if signature in fragments:
+                    return ( signature )
+    return ( None )
+
+#
+def __header_channels__(signature, head_1, head_2):
+    ''' Channel names of the data columns and the width of the values,
+        HV files name the hardware channel (maXX/chXX) in the first
+        header row, temperature files the sensor label in the second '''
+    if signature == HVI_SIGNATURE:
+        return ( [ entry[23:32] for entry in head_1 if entry != '' ], 8 )
+    return ( [ entry[14:21] for entry in head_2 if entry != '' ], 7 )
+
+#
+class ScanSourceRouter:
+    """ ---------------------------------------------------------------- """
+    """  This class lists the folder with data files only once, reads    """
+    """  the header of each csv file and routes the file to the decoder  """
+    """  that understands its signature (HV currents or temperatures)    """
+    """ ---------------------------------------------------------------- """
+
+    # -> constructor
+    # ---------------
+    def __init__(self, data_path):
+        self.__members__ = {
+            'class_id'          : 'ScanSourceRouter'
+           ,'__path__'          : ''
+           ,'__status__'        : None
+           ,'__FILES__'         : [ ]
+           ,'__SOURCES__'       : { }
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__path__'          : """ path to the encoded data files """
+           ,'__status__'        : """ processing status """
+           ,'__FILES__'         : """ content of the data folder """
+           ,'__SOURCES__'       : """ [file, head_1, head_2] lists per signature """
+        }
+
+        if data_path != None and data_path != '' and os.path.exists(data_path):
+            self.__members__['__path__'] = data_path
+            self.__members__['__status__'] = SUCCESS
+            self.__route__()
+        else:
+            print " --> Fatal problem! Given data path: ", data_path
+            print "     is INVALID!!  Processing is terminated! "
+            self.__members__['__status__'] = FAILURE
+
+    # -> check the router status
+    # --------------------------
+    def getStatus(self):
+        return ( self.__members__['__status__'] )
+
+    # -> class name
+    # -------------
+    def getName(self):
+        return ( self.__members__['class_id'] )
+
+    # -> all the files found in the data folder
+    # -----------------------------------------
+    def getFiles(self):
+        return ( self.__members__['__FILES__'] )
+
+    # -> sources with the given header signature, each source is a list
+    #    [file name, first header row, second header row]
+    # ------------------------------------------------------------------
+    def getSources(self, signature):
+        return ( self.__members__['__SOURCES__'].get(signature, []) )
+
+    # -> stream the data records of a file, the file is closed as soon
+    #    as the last record has been read
+    # ----------------------------------------------------------------
+    def getRows(self, file):
+        raw = open(self.__members__['__path__'] + '/' + file, 'rb')
+        try:
+            rows = csv.reader(raw)
+            rows.next()
+            rows.next()
+            for row in rows:
+                yield row
+        finally:
+            raw.close()
+
+    # -> the signature found in the first header row, None if unknown
+    # ---------------------------------------------------------------
+    def __signature__(self, head_1):
+        return ( __scan_signature__(head_1) )
+
+    # -> open each file once, read only the header and close it
+    # ---------------------------------------------------------
+    def __route__(self):
+        __path__ = self.__members__['__path__']
+        self.__members__['__FILES__'] = sorted(os.listdir(__path__))
+        for file in self.__members__['__FILES__']:
+            # -> folders (e.g. the decoded cache) are not data files
+            if not os.path.isfile(__path__ + '/' + file):
+                continue
+            try:
+                raw = open(__path__ + '/' + file, 'rb')
+            except IOError:
+                print ' --> Problem with reading data file: ', file
+                continue
+            # -> only the header is read here, the file is closed whatever
+            #    its signature, getRows opens it again for the decoder
+            try:
+                header = csv.reader(raw)
+                head_1 = header.next()
+                head_2 = header.next()
+            except (StopIteration, csv.Error):
+                print ' --> Problem with reading data file: ', file
+                continue
+            finally:
+                raw.close()
+            signature = self.__signature__(head_1)
+            if signature == None:
+                continue
+            if signature not in self.__members__['__SOURCES__']:
+                self.__members__['__SOURCES__'][signature] = []
+            self.__members__['__SOURCES__'][signature].append([file, head_1, head_2])
+
+#
+class SampleSeries(object):
+    """ ---------------------------------------------------------------- """
+    """  Time ordered samples of one channel: seconds in an array('i')   """
+    """  and values in an array('d'), about 12 bytes a sample instead of """
+    """  a [time, value] list per sample. Indexing gives the same        """
+    """  (time, value) pair and slicing a new series, so the callers of  """
+    """  getData() see no change. The arrays may also be numpy arrays,   """
+    """  a read only view over the columns of a ColumnarSeries           """
+    """ ---------------------------------------------------------------- """
+
+    __slots__ = ( 'time', 'value' )
+
+    def __init__(self, time = None, value = None):
+        self.time = array('i') if time is None else time
+        self.value = array('d') if value is None else value
+
+    # -> append a [time, value] point
+    def append(self, point):
+        self.time.append(point[TIME])
+        self.value.append(float(point[HVI]))
+
+    # -> append all the points of another series
+    def extend(self, points):
+        self.time.extend(points.time)
+        self.value.extend(points.value)
+
+    def __len__(self):
+        return ( len(self.time) )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ( SampleSeries(self.time[index], self.value[index]) )
+        return ( ( int(self.time[index]), float(self.value[index]) ) )
+
+    def __iter__(self):
+        return ( izip(self.time.tolist(), self.value.tolist()) )
+
+    # -> the process pool pickles the series decoded by the workers
+    def __getstate__(self):
+        return ( ( self.time, self.value ) )
+
+    def __setstate__(self, state):
+        self.time, self.value = state
+
+#
+class ColumnarSeries:
+    """ ---------------------------------------------------------------- """
+    """  Columnar representation of the decoded data: for each channel   """
+    """  an int32 array of seconds and a float64 array of values, plus   """
+    """  an index translating the channel name into its position        """
+    """ ---------------------------------------------------------------- """
+
+    # -> constructor
+    # ---------------
+    def __init__(self):
+        self.__members__ = {
+            'class_id'          : 'ColumnarSeries'
+           ,'__INDEX__'         : { }
+           ,'__CHANNELS__'      : [ ]
+           ,'__TIME__'          : [ ]
+           ,'__VALUE__'         : [ ]
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__INDEX__'         : """ channel name -> position in the arrays lists """
+           ,'__CHANNELS__'      : """ channel names in the order of booking """
+           ,'__TIME__'          : """ int32 arrays with time in seconds """
+           ,'__VALUE__'         : """ float64 arrays with the measured values """
+        }
+
+    # -> class name
+    # -------------
+    def getName(self):
+        return ( self.__members__['class_id'] )
+
+    def getChannels(self):
+        return ( self.__members__['__CHANNELS__'] )
+
+    def getIndex(self):
+        return ( self.__members__['__INDEX__'] )
+
+    def getTime(self, channel):
+        return ( self.__members__['__TIME__'][self.__members__['__INDEX__'][channel]] )
+
+    def getValues(self, channel):
+        return ( self.__members__['__VALUE__'][self.__members__['__INDEX__'][channel]] )
+
+    # -> (time, values) pair of arrays for a channel
+    def getSeries(self, channel):
+        position = self.__members__['__INDEX__'][channel]
+        return ( self.__members__['__TIME__'][position], self.__members__['__VALUE__'][position] )
+
+    # -> book a new channel with already prepared arrays
+    # --------------------------------------------------
+    def addChannel(self, channel, time, values):
+        self.__members__['__INDEX__'][channel] = len(self.__members__['__CHANNELS__'])
+        self.__members__['__CHANNELS__'].append(channel)
+        self.__members__['__TIME__'].append(numpy.asarray(time, dtype = numpy.int32))
+        self.__members__['__VALUE__'].append(numpy.asarray(values, dtype = numpy.float64))
+
+    # -> convert the decoder output {channel: SampleSeries}, the arrays
+    #    are copied in one go, no loop over the samples
+    # -----------------------------------------------------------------
+    def fill(self, data):
+        for channel in sorted(data):
+            points = data[channel]
+            time = numpy.frombuffer(points.time, dtype = numpy.intc).astype(numpy.int32)
+            values = numpy.frombuffer(points.value, dtype = numpy.float64).copy()
+            self.addChannel(channel, time, values)
+
+    # -> back to the decoder output format {channel: SampleSeries}, the
+    #    series are views over the columns, nothing is copied
+    # -----------------------------------------------------------------
+    def getPoints(self):
+        data = {}
+        for channel in self.__members__['__CHANNELS__']:
+            time, values = self.getSeries(channel)
+            data[channel] = SampleSeries(time, values)
+        return ( data )
+
+#
+class DecodedScanCache:
+    """ ---------------------------------------------------------------- """
+    """  On-disk cache of the decoded series. Each decoder output is     """
+    """  stored as .npy files under a key built from the size, mtime,    """
+    """  header rows and a hash of the last block of the source csv      """
+    """  files and from the decoder version                              """
+    """ ---------------------------------------------------------------- """
+
+    # -> constructor
+    # ---------------
+    def __init__(self, data_path, cache_dir = None):
+        self.__members__ = {
+            'class_id'          : 'DecodedScanCache'
+           ,'__path__'          : data_path
+           ,'__cache_dir__'     : cache_dir
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__path__'          : """ path to the encoded data files """
+           ,'__cache_dir__'     : """ folder with the cached entries """
+        }
+        if cache_dir == None or cache_dir == '':
+            self.__members__['__cache_dir__'] = os.path.join(data_path, CACHE_FOLDER)
+
+    # -> class name
+    # -------------
+    def getName(self):
+        return ( self.__members__['class_id'] )
+
+    def getCacheDir(self):
+        return ( self.__members__['__cache_dir__'] )
+
+    # -> True if the decoded data of these sources is in the cache
+    # ------------------------------------------------------------
+    def hasEntry(self, class_id, sources):
+        entry = os.path.join(self.__members__['__cache_dir__'], self.__key__(class_id, sources))
+        return ( os.path.isdir(entry) )
+
+    # -> entries of one decoder for one scan start with this prefix, the
+    #    scans sharing a cache folder never replace each other's entries
+    # -------------------------------------------------------------------
+    def __prefix__(self, class_id):
+        scan = hashlib.md5(os.path.realpath(self.__members__['__path__'])).hexdigest()[:12]
+        return ( class_id + '-' + scan + '-' )
+
+    # -> key of the entry: prefix + hash of the source fingerprints. The
+    #    header rows and the last block of each file are hashed too, a
+    #    file rewritten with the same size within the mtime resolution
+    #    (e.g. re-exported by the DAQ) still gets a new key
+    # ------------------------------------------------------------------
+    def __key__(self, class_id, sources):
+        fingerprint = hashlib.md5()
+        fingerprint.update('%s:%d' % (class_id, DECODER_VERSION))
+        for source in sources:
+            file_path = os.path.join(self.__members__['__path__'], source[0])
+            stat = os.stat(file_path)
+            fingerprint.update(':%s:%d:%d' % (source[0], stat.st_size, int(stat.st_mtime * 1000)))
+            fingerprint.update(repr(source[1]) + repr(source[2]))
+            raw = open(file_path, 'rb')
+            try:
+                raw.seek(max(stat.st_size - CACHE_TAIL_BLOCK, 0))
+                fingerprint.update(raw.read(CACHE_TAIL_BLOCK))
+            finally:
+                raw.close()
+        return ( self.__prefix__(class_id) + fingerprint.hexdigest() )
+
+    # -> returns [scan time and date, ColumnarSeries] or None if not cached
+    # ---------------------------------------------------------------------
+    def load(self, class_id, sources):
+        entry = os.path.join(self.__members__['__cache_dir__'], self.__key__(class_id, sources))
+        if not os.path.isdir(entry):
+            return ( None )
+        try:
+            index = open(os.path.join(entry, 'index.txt'), 'rb').read().splitlines()
+            offsets = numpy.load(os.path.join(entry, 'offsets.npy'))
+            time = numpy.load(os.path.join(entry, 'time.npy'), mmap_mode = 'r')
+            values = numpy.load(os.path.join(entry, 'values.npy'), mmap_mode = 'r')
+        except (IOError, ValueError):
+            print ' --> Corrupted cache entry, will decode the csv files: ', entry
+            return ( None )
+        columns = ColumnarSeries()
+        for position, channel in enumerate(index[1:]):
+            first, last = offsets[position], offsets[position + 1]
+            columns.addChannel(channel, time[first:last], values[first:last])
+        print ' --> ', class_id, 'data read from the cache: ', entry
+        return ( [index[0], columns] )
+
+    # -> write a new entry and drop the outdated ones of the same decoder
+    #    and the same scan
+    # -------------------------------------------------------------------
+    def store(self, class_id, sources, tdate, columns):
+        cache_dir = self.__members__['__cache_dir__']
+        key = self.__key__(class_id, sources)
+        entry = os.path.join(cache_dir, key)
+        temp_entry = entry + '.tmp%d' % os.getpid()
+        channels = columns.getChannels()
+        offsets = numpy.zeros(len(channels) + 1, dtype = numpy.int64)
+        for position, channel in enumerate(channels):
+            offsets[position + 1] = offsets[position] + len(columns.getTime(channel))
+        try:
+            if not os.path.isdir(temp_entry):
+                os.makedirs(temp_entry)
+            index = open(os.path.join(temp_entry, 'index.txt'), 'wb')
+            index.write('\n'.join([tdate] + channels) + '\n')
+            index.close()
+            numpy.save(os.path.join(temp_entry, 'offsets.npy'), offsets)
+            numpy.save(os.path.join(temp_entry, 'time.npy'),
+                       numpy.concatenate([columns.getTime(channel) for channel in channels] or [numpy.zeros(0, numpy.int32)]))
+            numpy.save(os.path.join(temp_entry, 'values.npy'),
+                       numpy.concatenate([columns.getValues(channel) for channel in channels] or [numpy.zeros(0)]))
+            for old_entry in os.listdir(cache_dir):
+                if old_entry.startswith(self.__prefix__(class_id)) and old_entry != os.path.basename(temp_entry):
+                    shutil.rmtree(os.path.join(cache_dir, old_entry), ignore_errors = True)
+            os.rename(temp_entry, entry)
+        except (IOError, OSError), err:
+            print ' --> Cannot write the cache entry ', entry, ': ', err
+            shutil.rmtree(temp_entry, ignore_errors = True)
+
 #
 class HVCurrentDecoder:
     """ ---------------------------------------------------------------- """
@@ -55,28 +676,30 @@ class HVCurrentDecoder:
     """  !! The constructor requires a path to the data files !!         """
     """ ---------------------------------------------------------------- """
 
+    __signature__ = HVI_SIGNATURE
+
     # -> constructor
     # ---------------
-    def __init__(self, data_path):
+    def __init__(self, data_path, source = None, cache = True, cache_dir = None, pool = None):
         self.__members__ = {
             'class_id'          : 'HVCurrentDecoder'
-           ,'__RAW__'           : []
-           ,'__HEADER__'        : { }
-           ,'__DECODED__'       : { }
+           ,'__SOURCE__'        : None
            ,'__path__'          : ''
            ,'__status__'        : None
            ,'__HVI__'           : { }
+           ,'__COLUMNS__'       : None
+           ,'__CACHE__'         : None
            ,'__scan_tdate__'    : None
         }
         self.__doc_fields__ = {
             'class_id'          : """ class name """
-           ,'__RAW__'           : """ pointers to the body of csv files """
-           ,'__HEADER__'        : """ structure containing all header data """
-           ,'__DECODED__'       : """ decode data - not separated """
+           ,'__SOURCE__'        : """ router shared between the decoders of one scan """
            ,'__DATA__'          : """ structure that holds the decoded data for all sensors """
            ,'__path__'          : """ path to the encoded data files """
            ,'__status__'        : """ processing status """
            ,'__HVI__'           : """ high voltage currents and time """
+           ,'__COLUMNS__'       : """ columnar (numpy) copy of the currents """
+           ,'__CACHE__'         : """ on-disk cache of the decoded series """
            ,'__scan_tdate__'    : """ time and date of the current scan """
         }
 
@@ -95,17 +718,29 @@ class HVCurrentDecoder:
             print " --> You must provide the path to the data files! "
             print "     Processing is terminated! "
             self.__members__['__status__'] = FAILURE
+        self.__members__['__SOURCE__'] = source
         self.__check_sources__()
-        self.__connect2raw__()
-        self.__check_content_and_write_data__()
-
-        # -> sanit check - must have the same number of headers and data blocks
-        if len(self.__members__['__DECODED__']) != len(self.__members__['__HEADER__']):
-            sefl.__members__['__status__'] = FAILURE
-            print ' --> FATAL! The number of headers and data block dont match! '
-
-        # -> and finally create time ordered hvis
-        self.__create_time_ordered_hvis__()
+        if cache and self.__members__['__status__'] == SUCCESS:
+            self.__members__['__CACHE__'] = DecodedScanCache(self.__members__['__path__'], cache_dir)
+
+        # -> warm run - the decoded currents come from the cache
+        with TRACER.span('cache_load') as span:
+            cached = self.__load_cache__()
+            span.count(hits = int(cached))
+        if cached:
+            return
+        with TRACER.span('csv_decode') as span:
+            if pool != None:
+                # -> the files are split into chunks decoded by the process pool
+                self.__decode_parallel__(pool)
+            else:
+                # -> stream the files straight into time ordered hvis
+                self.__create_time_ordered_hvis__()
+            span.count(files = len(self.__members__['__SOURCE__'].getSources(self.__signature__)),
+                       channels = len(self.__members__['__HVI__']),
+                       rows = sum([ len(points) for points in self.__members__['__HVI__'].values() ]))
+        with TRACER.span('cache_store'):
+            self.__store_cache__()
 
         #print len(self.__members__['__HVI__'].keys())
 
@@ -128,84 +763,86 @@ class HVCurrentDecoder:
 
     # -> return the time-ordered currents
     def getData(self):
+        if self.__members__['__HVI__'] == None:
+            self.__members__['__HVI__'] = self.__members__['__COLUMNS__'].getPoints()
         return ( self.__members__['__HVI__'] )
+
+    # -> the same data as contiguous numpy arrays, built on first request
+    def getColumns(self):
+        if self.__members__['__COLUMNS__'] == None:
+            columns = ColumnarSeries()
+            columns.fill(self.__members__['__HVI__'])
+            self.__members__['__COLUMNS__'] = columns
+            # -> getData() gives views over the columns from now on
+            self.__members__['__HVI__'] = None
+        return ( self.__members__['__COLUMNS__'] )
+
+    # -> read the decoded data from the cache, True if found
+    # ------------------------------------------------------
+    def __load_cache__(self):
+        cache = self.__members__['__CACHE__']
+        sources = self.__members__['__SOURCE__'].getSources(self.__signature__)
+        if cache == None or len(sources) == 0:
+            return ( False )
+        cached = cache.load(self.__members__['class_id'], sources)
+        if cached == None:
+            return ( False )
+        self.__members__['__scan_tdate__'] = cached[0]
+        self.__members__['__COLUMNS__'] = cached[1]
+        self.__members__['__HVI__'] = None
+        return ( True )
+
+    # -> save the decoded data for the next runs
+    # ------------------------------------------
+    def __store_cache__(self):
+        cache = self.__members__['__CACHE__']
+        if cache != None and self.__members__['__status__'] == SUCCESS:
+            sources = self.__members__['__SOURCE__'].getSources(self.__signature__)
+            # -> nothing was decoded, there is nothing to keep
+            if len(sources) == 0 or self.__members__['__scan_tdate__'] == None:
+                return
+            cache.store(self.__members__['class_id'], sources, self.__members__['__scan_tdate__'], self.getColumns())
+
+    # -> decode chunks of the files on the process pool and merge
+    #    the results, in file and chunk order, into __HVI__
+    # ---------------------------------------------------------------
+    def __decode_parallel__(self, pool):
+        __path__ = self.__members__['__path__']
+        tasks = []
+        for file, head_1, head_2 in self.__members__['__SOURCE__'].getSources(self.__signature__):
+            channels, width = __header_channels__(self.__signature__, head_1, head_2)
+            for first, last in __file_chunks__(__path__ + '/' + file, DECODE_CHUNK_SIZE):
+                tasks.append([__path__ + '/' + file, first, last, channels, width])
+        for tdate, data in pool.map(__decode_chunk__, tasks):
+            if self.__members__['__scan_tdate__'] == None:
+                self.__members__['__scan_tdate__'] = tdate
+            for channel in data:
+                if channel not in self.__members__['__HVI__']:
+                    self.__members__['__HVI__'][channel] = SampleSeries()
+                self.__members__['__HVI__'][channel].extend(data[channel])
     
     # -> check what is inside the folder with data files
     # --------------------------------------------------
     def __check_sources__(self):
+        if self.__members__['__SOURCE__'] == None:
+            self.__members__['__SOURCE__'] = ScanSourceRouter(self.__members__['__path__'])
         print ' --> I will attempt to decode the following files: '
         print ' ------------------------------------------------- '
-        list = os.listdir(self.__members__['__path__'])
-        for file in list:
-            print file
+        for source in self.__members__['__SOURCE__'].getSources(self.__signature__):
+            print source[0]
         print ' ------------------------------------------------- '
         
-    # -> connect to file and read data
-    # --------------------------------
-    def __connect2raw__(self):
-        __path__=self.__members__['__path__']
-        try:
-            list = os.listdir(__path__)
-            for file in list:
-                raw = csv.reader(open(__path__ + '/' + file, 'rb'))
-                self.__members__['__RAW__'].append(raw)
-        except IOError:
-            print ' --> Problem with reading data files '
-            self.__members__['__status__'] = FAILURE
-            
-    # -> check which files contain HV currents, discard if not currents
-    # -----------------------------------------------------------------
-    def __check_content_and_write_data__(self):
-        raw_data = self.__members__['__RAW__']
-        for item, source in enumerate(raw_data):
-            header = []
-            decoded_data = []
-            hvi_file = False
-            head_1 = source.next()
-            head_2 = source.next()
-            for entry in head_1:
-                if entry != '':
-                    if HVI_SIGNATURE in entry.split(':'):
-                        hvi_file = True
-                        break
-            if hvi_file:
-                header.append(head_1)
-                for record in source:
-                    decoded_data.append(record)
-                self.__members__['__DECODED__'][item] = decoded_data
-                self.__members__['__HEADER__'][item] = header
-                
-    # -> grab the data and create time ordered tables for each sensor
+    # -> stream the rows of each file straight into time ordered tables
+    #    for each sensor, a file is closed as soon as it is consumed
     # ---------------------------------------------------------------
     def __create_time_ordered_hvis__(self):
-        hvis = self.__members__['__DECODED__']
-        headers = self.__members__['__HEADER__']
-        first_key = hvis.keys()[0]
-        self.__members__['__scan_tdate__'] = hvis[first_key][0][0][:19]
-        
-        # -> must be the same for both headers and decoded data
-        keys = headers.keys()
-
-        # -> now save (time, hvi) pairs for each sensor
-        for key in keys:
-            data = hvis[key]
-            header = headers[key]
-            channels = []
-            for entry in header:
-                for entry_element in entry:
-                    if entry_element != '':
-                        channels.append(entry_element[23:32])
-            for entry in data:
-                time = entry[0][11:19]
-                e_data = []
-                for index in range(1, len(entry) - 1):
-                    e_data.append(entry[index])
-                for chan, current in enumerate(e_data):
-                    if current not in NULL_ENTRIES:
-                        if channels[chan] not in self.__members__['__HVI__']:
-                            self.__members__['__HVI__'][channels[chan]] = []
-                        t_hvi = [time, current[:8]] 
-                        self.__members__['__HVI__'][channels[chan]].append(t_hvi)
+        source = self.__members__['__SOURCE__']
+        for file, head_1, head_2 in source.getSources(self.__signature__):
+            # -> header entries hold the hardware channel: maXX/chXX
+            channels, width = __header_channels__(self.__signature__, head_1, head_2)
+            tdate = __decode_rows__(source.getRows(file), channels, width, self.__members__['__HVI__'])
+            if self.__members__['__scan_tdate__'] == None:
+                self.__members__['__scan_tdate__'] = tdate
 
 #
 class TemperatureDecoder:
@@ -214,29 +851,31 @@ class TemperatureDecoder:
     """  !! The constructor requires a path to the data files !!           """
     """ ------------------------------------------------------------------ """
 
+    __signature__ = TEMP_SIGNATURE
+
     # -> constructor
     # ---------------
-    def __init__(self, data_path, deb = False):
+    def __init__(self, data_path, deb = False, source = None, cache = True, cache_dir = None, pool = None):
         self.__members__ = {
             'class_id'          : 'TemperatureDecoder'
-           ,'__RAW__'           : []
-           ,'__HEADER__'        : { }
-           ,'__DECODED__'       : { }
+           ,'__SOURCE__'        : None
            ,'__path__'          : ''
            ,'__status__'        : None
            ,'__TEMP__'          : { }
+           ,'__COLUMNS__'       : None
+           ,'__CACHE__'         : None
            ,'__scan_tdate__'    : None
            ,'DEBUG'             : False
         }
         self.__doc_fields__ = {
             'class_id'          : """ class name """
-           ,'__RAW__'           : """ pointers to the body of csv files """
-           ,'__HEADER__'        : """ structure containing all header data """
-           ,'__DECODED__'       : """ decode data - not separated """
+           ,'__SOURCE__'        : """ router shared between the decoders of one scan """
            ,'__DATA__'          : """ structure that holds the decoded data for all sensors """
            ,'__path__'          : """ path to the encoded data files """
            ,'__status__'        : """ processing status """
            ,'__TEMP__'          : """ temperature and time """
+           ,'__COLUMNS__'       : """ columnar (numpy) copy of the temperatures """
+           ,'__CACHE__'         : """ on-disk cache of the decoded series """
            ,'__scan_tdate__'    : """ time and date of the current scan """
            ,'DEBUG'             : """ debug flag """
         }
@@ -258,19 +897,30 @@ class TemperatureDecoder:
             print " --> You must provide the path to the data files! "
             print "     Processing is terminated! "
             self.__members__['__status__'] = FAILURE
+        self.__members__['__SOURCE__'] = source
         self.__members__['DEBUG'] = deb
         self.__check_sources__()
-        self.__connect2raw__()
-        self.__check_content_and_write_data__()
-
-        # -> sanity check - must have the same number of headers and data blocks
-        if len(self.__members__['__DECODED__']) != len(self.__members__['__HEADER__']):
-            sefl.__members__['__status__'] = FAILURE
-            print ' --> FATAL! The number of headers and data block dont match! '
-            exit(2)
-
-        # -> and finally create time ordered temperatures
-        self.__create_time_ordered_temps__()
+        if cache and self.__members__['__status__'] == SUCCESS:
+            self.__members__['__CACHE__'] = DecodedScanCache(self.__members__['__path__'], cache_dir)
+
+        # -> warm run - the decoded temperatures come from the cache
+        with TRACER.span('cache_load') as span:
+            cached = self.__load_cache__()
+            span.count(hits = int(cached))
+        if cached:
+            return
+        with TRACER.span('csv_decode') as span:
+            if pool != None:
+                # -> the files are split into chunks decoded by the process pool
+                self.__decode_parallel__(pool)
+            else:
+                # -> stream the files straight into time ordered temperatures
+                self.__create_time_ordered_temps__()
+            span.count(files = len(self.__members__['__SOURCE__'].getSources(self.__signature__)),
+                       channels = len(self.__members__['__TEMP__']),
+                       rows = sum([ len(points) for points in self.__members__['__TEMP__'].values() ]))
+        with TRACER.span('cache_store'):
+            self.__store_cache__()
 
     # -> check the decoder status
     # ---------------------------
@@ -291,95 +941,179 @@ class TemperatureDecoder:
 
     # -> return the time-ordered currents
     def getData(self):
+        if self.__members__['__TEMP__'] == None:
+            self.__members__['__TEMP__'] = self.__members__['__COLUMNS__'].getPoints()
         return ( self.__members__['__TEMP__'] )
+
+    # -> the same data as contiguous numpy arrays, built on first request
+    def getColumns(self):
+        if self.__members__['__COLUMNS__'] == None:
+            columns = ColumnarSeries()
+            columns.fill(self.__members__['__TEMP__'])
+            self.__members__['__COLUMNS__'] = columns
+            # -> getData() gives views over the columns from now on
+            self.__members__['__TEMP__'] = None
+        return ( self.__members__['__COLUMNS__'] )
+
+    # -> read the decoded data from the cache, True if found
+    # ------------------------------------------------------
+    def __load_cache__(self):
+        cache = self.__members__['__CACHE__']
+        sources = self.__members__['__SOURCE__'].getSources(self.__signature__)
+        if cache == None or len(sources) == 0:
+            return ( False )
+        cached = cache.load(self.__members__['class_id'], sources)
+        if cached == None:
+            return ( False )
+        self.__members__['__scan_tdate__'] = cached[0]
+        self.__members__['__COLUMNS__'] = cached[1]
+        self.__members__['__TEMP__'] = None
+        return ( True )
+
+    # -> save the decoded data for the next runs
+    # ------------------------------------------
+    def __store_cache__(self):
+        cache = self.__members__['__CACHE__']
+        if cache != None and self.__members__['__status__'] == SUCCESS:
+            sources = self.__members__['__SOURCE__'].getSources(self.__signature__)
+            # -> nothing was decoded, there is nothing to keep
+            if len(sources) == 0 or self.__members__['__scan_tdate__'] == None:
+                return
+            cache.store(self.__members__['class_id'], sources, self.__members__['__scan_tdate__'], self.getColumns())
+
+    # -> decode chunks of the files on the process pool and merge
+    #    the results, in file and chunk order, into __TEMP__
+    # ---------------------------------------------------------------
+    def __decode_parallel__(self, pool):
+        __path__ = self.__members__['__path__']
+        tasks = []
+        for file, head_1, head_2 in self.__members__['__SOURCE__'].getSources(self.__signature__):
+            channels, width = __header_channels__(self.__signature__, head_1, head_2)
+            for first, last in __file_chunks__(__path__ + '/' + file, DECODE_CHUNK_SIZE):
+                tasks.append([__path__ + '/' + file, first, last, channels, width])
+        for tdate, data in pool.map(__decode_chunk__, tasks):
+            if self.__members__['__scan_tdate__'] == None:
+                self.__members__['__scan_tdate__'] = tdate
+            for channel in data:
+                if channel not in self.__members__['__TEMP__']:
+                    self.__members__['__TEMP__'][channel] = SampleSeries()
+                self.__members__['__TEMP__'][channel].extend(data[channel])
     
     # -> check what is inside the folder with data files
     # --------------------------------------------------
     def __check_sources__(self):
+        if self.__members__['__SOURCE__'] == None:
+            self.__members__['__SOURCE__'] = ScanSourceRouter(self.__members__['__path__'])
         print ' --> I will attempt to decode the following files: '
         print ' ------------------------------------------------- '
-        list = os.listdir(self.__members__['__path__'])
-        for file in list:
-            print file
+        for source in self.__members__['__SOURCE__'].getSources(self.__signature__):
+            print source[0]
         print ' ------------------------------------------------- '
         
-    # -> connect to file and read data, create a reader object
-    # --------------------------------------------------------
-    def __connect2raw__(self):
-        __path__=self.__members__['__path__']
-        try:
-            list = os.listdir(__path__)
-            for file in list:
-                raw = csv.reader(open(__path__ + '/' + file, 'rb'))
-                self.__members__['__RAW__'].append(raw)
-        except IOError:
-            print ' --> Problem with reading data files '
-            self.__members__['__status__'] = FAILURE
-            
-    # -> check which files contain HV currents, discard if not currents
-    # -----------------------------------------------------------------
-    def __check_content_and_write_data__(self):
+    # -> stream the rows of each file straight into time ordered tables
+    #    for each sensor, a file is closed as soon as it is consumed
+    # ---------------------------------------------------------------
+    def __create_time_ordered_temps__(self):
         DEBUG = self.__members__['DEBUG']
-        raw_data = self.__members__['__RAW__']
-        if DEBUG:
-            print len(raw_data)
-        for item, source in enumerate(raw_data):
-            if DEBUG:
-                print item
-            header = []
-            decoded_data = []
-            temp_file = False
-            head_1 = source.next()
-            head_2 = source.next()
+        source = self.__members__['__SOURCE__']
+        for file, head_1, head_2 in source.getSources(self.__signature__):
             if DEBUG:
+                print file
                 print head_2
-            for entry in head_1:
-                if entry != '':
-                    if TEMP_SIGNATURE in entry.split(':'):
-                        temp_file = True
-                        break
-            if temp_file:
-                header.append(head_2)
-                for record in source:
-                    decoded_data.append(record)
-                self.__members__['__DECODED__'][item] = decoded_data
-                self.__members__['__HEADER__'][item] = header
-
-    # -> grab the data and create time ordered tables for each sensor
-    # ---------------------------------------------------------------
-    def __create_time_ordered_temps__(self):
-        temps = self.__members__['__DECODED__']
-        headers = self.__members__['__HEADER__']
-        first_key = temps.keys()[0]
-        self.__members__['__scan_tdate__'] = temps[first_key][0][0][:19]
-        #print self.__members__['__scan_tdate__'] 
-        
-        # -> must be the same for both headers and decoded data
-        keys = headers.keys()
-
-        # -> now save (time, temp) pairs for each sensor
-        for key in keys:
-            data = temps[key]
-            header = headers[key]
-            channels = []
-            for entry in header:
-                for entry_element in entry:
-                    if entry_element != '':
-                        channels.append(entry_element[14:21])
-                        #print entry_element[14:21]
-            for entry in data:
-                time = entry[0][11:19]
-                e_data = []
-                for index in range(1, len(entry) - 1):
-                    e_data.append(entry[index])
-                for chan, temp in enumerate(e_data):
-                    if temp not in NULL_ENTRIES:
-                        if channels[chan] not in self.__members__['__TEMP__']:
-                            self.__members__['__TEMP__'][channels[chan]] = []
-                        t_temp = [time, temp[:7]]
-                        #if channels[chan] == 'VL08_CT':
-                        #    print t_temp
-                        self.__members__['__TEMP__'][channels[chan]].append(t_temp)
+            # -> header entries hold the sensor label: XXXX_XX
+            channels, width = __header_channels__(self.__signature__, head_1, head_2)
+            tdate = __decode_rows__(source.getRows(file), channels, width, self.__members__['__TEMP__'])
+            if self.__members__['__scan_tdate__'] == None:
+                self.__members__['__scan_tdate__'] = tdate
+
+#
+class VeloChannelMap:
+    """ ---------------------------------------------------------------- """
+    """  Detector channel map read from a data file (VeloChannelMap.csv) """
+    """  Each sensor is an immutable record (label, HV channel, sensor   """
+    """  number, z, type) reachable from its label, HV channel or sensor """
+    """  number. Use get_channel_map() to share one instance per file    """
+    """ ---------------------------------------------------------------- """
+
+    def __init__(self, map_file = CHANNEL_MAP_FILE):
+        self.__members__ = {
+            'class_id'          : 'VeloChannelMap'
+           ,'__map_file__'      : map_file
+           ,'__RECORDS__'       : ()
+           ,'__BY_LABEL__'      : { }
+           ,'__BY_HV_CHANNEL__' : { }
+           ,'__BY_SENSOR__'     : { }
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__map_file__'      : """ data file with the map """
+           ,'__RECORDS__'       : """ (label, hv channel, sensor, z, type) in file order """
+           ,'__BY_LABEL__'      : """ label -> record """
+           ,'__BY_HV_CHANNEL__' : """ hardware HV channel (maXX/chXX) -> record """
+           ,'__BY_SENSOR__'     : """ sensor number -> record """
+        }
+        self.__load__()
+
+    def __load__(self):
+        records = []
+        for entry in csv.reader(open(self.__members__['__map_file__'], 'rb')):
+            if len(entry) == 0 or entry[0].startswith('#'):
+                continue
+            label, hv_channel, sensor, z, sensor_type = [ field.strip() for field in entry ]
+            record = ( label, hv_channel, int(sensor), float(z), int(sensor_type) )
+            records.append(record)
+            self.__members__['__BY_LABEL__'][label] = record
+            self.__members__['__BY_HV_CHANNEL__'][hv_channel] = record
+            self.__members__['__BY_SENSOR__'][record[MAP_SENSOR]] = record
+        self.__members__['__RECORDS__'] = tuple(records)
+
+    def getName(self):
+        return ( self.__members__['class_id'] )
+
+    def getRecords(self):
+        return ( self.__members__['__RECORDS__'] )
+
+    def getLabels(self):
+        return ( [ record[MAP_LABEL] for record in self.__members__['__RECORDS__'] ] )
+
+    def getHVChannels(self):
+        return ( [ record[MAP_HV_CHANNEL] for record in self.__members__['__RECORDS__'] ] )
+
+    # -> full record for a label, hardware HV channel or sensor number
+    # ----------------------------------------------------------------
+    def byLabel(self, label):
+        return ( self.__members__['__BY_LABEL__'][label] )
+
+    def byHVChannel(self, hvChan):
+        return ( self.__members__['__BY_HV_CHANNEL__'][hvChan] )
+
+    def bySensor(self, sensor):
+        return ( self.__members__['__BY_SENSOR__'][sensor] )
+
+    def hasLabel(self, label):
+        return ( label in self.__members__['__BY_LABEL__'] )
+
+    def hasHVChannel(self, hvChan):
+        return ( hvChan in self.__members__['__BY_HV_CHANNEL__'] )
+
+#
+__CHANNEL_MAPS__ = {}
+__CHANNEL_MAPS_LOCK__ = threading.Lock()
+
+def get_channel_map(map_file = CHANNEL_MAP_FILE):
+    ''' Returns the process-wide VeloChannelMap of the given data file,
+        the file is read on the first call only '''
+    channel_map = __CHANNEL_MAPS__.get(map_file)
+    if channel_map == None:
+        __CHANNEL_MAPS_LOCK__.acquire()
+        try:
+            if map_file not in __CHANNEL_MAPS__:
+                __CHANNEL_MAPS__[map_file] = VeloChannelMap(map_file)
+            channel_map = __CHANNEL_MAPS__[map_file]
+        finally:
+            __CHANNEL_MAPS_LOCK__.release()
+
+    return ( channel_map )
 
 #
 class HVChannelMapper:
@@ -388,140 +1122,37 @@ class HVChannelMapper:
     """  channels and the Velo source id (sensor) numbers                """
     """ ---------------------------------------------------------------- """
 
-    def __init__(self):
+    def __init__(self, map_file = CHANNEL_MAP_FILE):
         self.__members__ = {
             'class_id'                    : 'HVChannelMapper'
-           ,'__HV_Channel2_Label_Sens__'  : { }
-        }
-        self.__createMap__()
-
-    def __createMap__(self):
-        # -> header data have format as follow: maXX/chXX
-        #    map will relate hardware channels with labels and sensors
-        # ----------------------
-        # -> side C, HV_Board00
-        self.__members__['__HV_Channel2_Label_Sens__']['ma06/ch00'] = ['PU01_CT', 129]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma06/ch01'] = ['PU02_CB', 131]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma06/ch02'] = ['VL01_CT', 65]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma06/ch03'] = ['VL01_CB', 1]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma06/ch04'] = ['VL02_CT', 3]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma06/ch05'] = ['VL02_CB', 67]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma06/ch06'] = ['VL03_CT', 69]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma06/ch07'] = ['VL03_CB', 5]
-        # -> side C, HV_Board01
-        self.__members__['__HV_Channel2_Label_Sens__']['ma07/ch00'] = ['VL04_CT', 7]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma07/ch01'] = ['VL04_CB', 71]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma07/ch02'] = ['VL05_CT', 73]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma07/ch03'] = ['VL05_CB', 9]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma07/ch04'] = ['VL06_CT', 11]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma07/ch05'] = ['VL06_CB', 75]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma07/ch06'] = ['VL07_CT', 77]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma07/ch07'] = ['VL07_CB', 13]
-        # -> side C, HV_Board02
-        self.__members__['__HV_Channel2_Label_Sens__']['ma08/ch00'] = ['VL08_CT', 15]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma08/ch01'] = ['VL08_CB', 79]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma08/ch02'] = ['VL09_CT', 81]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma08/ch03'] = ['VL09_CB', 17]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma08/ch04'] = ['VL10_CT', 19]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma08/ch05'] = ['VL10_CB', 83]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma08/ch06'] = ['VL11_CT', 85]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma08/ch07'] = ['VL11_CB', 21]
-        # -> side C, HV_Board03
-        self.__members__['__HV_Channel2_Label_Sens__']['ma09/ch00'] = ['VL12_CT', 23]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma09/ch01'] = ['VL12_CB', 87]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma09/ch02'] = ['VL13_CT', 89]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma09/ch03'] = ['VL13_CB', 25]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma09/ch04'] = ['VL14_CT', 27]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma09/ch05'] = ['VL14_CB', 91]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma09/ch06'] = ['VL15_CT', 93]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma09/ch07'] = ['VL15_CB', 29]
-        # -> side C, HV_Board04
-        self.__members__['__HV_Channel2_Label_Sens__']['ma10/ch00'] = ['VL16_CT', 31]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma10/ch01'] = ['VL16_CB', 95]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma10/ch02'] = ['VL19_CT', 97]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma10/ch03'] = ['VL19_CB', 33]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma10/ch04'] = ['VL22_CT', 35]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma10/ch05'] = ['VL22_CB', 99]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma10/ch06'] = ['VL23_CT', 101]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma10/ch07'] = ['VL23_CB', 37]
-        # -> side C, HV_Board05
-        self.__members__['__HV_Channel2_Label_Sens__']['ma11/ch00'] = ['VL24_CT', 39]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma11/ch01'] = ['VL24_CB', 103]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma11/ch02'] = ['VL25_CT', 105]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma11/ch03'] = ['VL25_CB', 41]
-        # ----------------------
-        # -> side A, HV_Board00
-        self.__members__['__HV_Channel2_Label_Sens__']['ma00/ch00'] = ['PU01_AT', 130]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma00/ch01'] = ['PU02_AB', 128]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma00/ch02'] = ['VL01_AT', 64]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma00/ch03'] = ['VL01_AB', 0]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma00/ch04'] = ['VL02_AT', 2]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma00/ch05'] = ['VL02_AB', 66]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma00/ch06'] = ['VL03_AT', 68]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma00/ch07'] = ['VL03_AB', 4]
-        # -> side A, HV_Board01
-        self.__members__['__HV_Channel2_Label_Sens__']['ma01/ch00'] = ['VL04_AT', 6]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma01/ch01'] = ['VL04_AB', 70]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma01/ch02'] = ['VL05_AT', 72]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma01/ch03'] = ['VL05_AB', 8]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma01/ch04'] = ['VL06_AT', 10]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma01/ch05'] = ['VL06_AB', 74]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma01/ch06'] = ['VL07_AT', 76]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma01/ch07'] = ['VL07_AB', 12]
-        # -> side A, HV_Board02
-        self.__members__['__HV_Channel2_Label_Sens__']['ma02/ch00'] = ['VL08_AT', 14]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma02/ch01'] = ['VL08_AB', 78]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma02/ch02'] = ['VL09_AT', 80]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma02/ch03'] = ['VL09_AB', 16]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma02/ch04'] = ['VL10_AT', 18]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma02/ch05'] = ['VL10_AB', 82]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma02/ch06'] = ['VL11_AT', 84]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma02/ch07'] = ['VL11_AB', 20]
-        # -> side C, HV_Board03
-        self.__members__['__HV_Channel2_Label_Sens__']['ma03/ch00'] = ['VL12_AT', 22]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma03/ch01'] = ['VL12_AB', 86]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma03/ch02'] = ['VL13_AT', 88]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma03/ch03'] = ['VL13_AB', 24]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma03/ch04'] = ['VL14_AT', 26]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma03/ch05'] = ['VL14_AB', 90]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma03/ch06'] = ['VL15_AT', 92]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma03/ch07'] = ['VL15_AB', 28]
-        # -> side A, HV_Board04
-        self.__members__['__HV_Channel2_Label_Sens__']['ma04/ch00'] = ['VL16_AT', 30]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma04/ch01'] = ['VL16_AB', 94]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma04/ch02'] = ['VL19_AT', 96]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma04/ch03'] = ['VL19_AB', 32]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma04/ch04'] = ['VL22_AT', 34]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma04/ch05'] = ['VL22_AB', 98]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma04/ch06'] = ['VL23_AT', 100]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma04/ch07'] = ['VL23_AB', 36]
-        # -> side A, HV_Board05
-        self.__members__['__HV_Channel2_Label_Sens__']['ma05/ch00'] = ['VL24_AT', 38]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma05/ch01'] = ['VL24_AB', 102]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma05/ch02'] = ['VL25_AT', 104]
-        self.__members__['__HV_Channel2_Label_Sens__']['ma05/ch03'] = ['VL25_AB', 40]
+           ,'__MAP__'                     : get_channel_map(map_file)
+        }
 
     def __auto_diagnostic_label__(self):
-        map = self.__members__['__HV_Channel2_Label_Sens__']
-        for chan in map:
-            print ' Hardware HV channel: ', chan, ' mapped to label: ', map[chan][LABEL]
+        for record in self.__members__['__MAP__'].getRecords():
+            print ' Hardware HV channel: ', record[MAP_HV_CHANNEL], ' mapped to label: ', record[MAP_LABEL]
             
     def __auto_diagnostic_sensor__(self):
-        map = self.__members__['__HV_Channel2_Label_Sens__']
-        for chan in map:
-            print ' Hardware HV channel: ', chan, ' mapped to sensor: ', map[chan][SENSOR]
+        for record in self.__members__['__MAP__'].getRecords():
+            print ' Hardware HV channel: ', record[MAP_HV_CHANNEL], ' mapped to sensor: ', record[MAP_SENSOR]
 
     # -> get label according to the hardware HV channel
     # -------------------------------------------------
     def HVChannel2Label(self, hvChan):
-        label = self.__members__['__HV_Channel2_Label_Sens__'][hvChan][LABEL]
+        label = self.__members__['__MAP__'].byHVChannel(hvChan)[MAP_LABEL]
         return ( label )
 
     # -> get sensor number according to the hardware HV channel
     # ---------------------------------------------------------
     def HVChannel2Sensor(self, hvChan):
-        sensor = self.__members__['__HV_Channel2_Label_Sens__'][hvChan][SENSOR]
+        sensor = self.__members__['__MAP__'].byHVChannel(hvChan)[MAP_SENSOR]
         return ( sensor )
+
+    # -> get the hardware HV channel according to the label
+    # -----------------------------------------------------
+    def Label2HVChannel(self, label):
+        hvChan = self.__members__['__MAP__'].byLabel(label)[MAP_HV_CHANNEL]
+        return ( hvChan )
 # 
 class PatternScanner():
     """ ------------------------------------------------------- """
@@ -585,9 +1216,15 @@ class PatternScanner():
                 print ' At time: ', time, ' we observed const temp: ', data[time][0][0], ' for ', data[time][0][1], ' sec ' 
 
     # -> search for const temperatures, simple patter recognition
+    #    the bin contents are read once, a pattern starts at a bin equal
+    #    (within __DELTA_T__) to the next one and ends at the first bin,
+    #    sampled every __PAT_STEP__ bins, that differs from the first
     def PatReco(self):
-        to_look_at = ['VL02_AT', 'VL04_CB', 'VL19_AB', 'VL09_AB']
         if self.__members__['__Status__']:
+            delta_t = self.__members__['__DELTA_T__']
+            delta_pat = self.__members__['__DELTA_PAT__']
+            leap = self.__members__['__LEAP__']
+            pat_step = max(int(self.__members__['__PAT_STEP__']), 1)
             t_banks = self.__members__['__T_H__']
             for data_bank in t_banks:
                 bank_label = data_bank.GetName()[TEMP_PREFIX:]
@@ -597,33 +1234,35 @@ class PatternScanner():
 
                 print ' --> Running Temp Pattern Recognition for sensor: ', bank_label
                 nbins = data_bank.GetNbinsX()
+                contents = histo_contents(data_bank)
+
+                # -> bins that may open a pattern: equal to the next bin
+                starts = numpy.flatnonzero(numpy.abs(contents[1:nbins + 1] - contents[2:nbins + 2]) < delta_t) + 1
 
                 # -> MAIN LOOP
-                bin = 0
-                while bin < nbins:
-                    bin += 1
-                    first_in_pattern = data_bank.GetBinContent(bin)
-                    next_in_pattern = data_bank.GetBinContent(bin + 1)
-                    is_equal = self.__compare_temp__(fabs(first_in_pattern - next_in_pattern))
-                    if is_equal:
-                        for p_bin in range(bin + 2, nbins):
-                            next_in_pattern = data_bank.GetBinContent(p_bin)
-                            is_constant = self.__compare_temp__(fabs(first_in_pattern - next_in_pattern))
-                            if is_constant:
-                                p_bin = p_bin + self.__members__['__PAT_STEP__']
-                                continue
-                            else:
-                                is_pattern = self.__compare_pat_length__(p_bin - bin)
-                                if is_pattern:
-                                    # -> store const temp, t_i and Delta_t
-                                    const_temp = round(first_in_pattern, 2)
-                                    time = int(data_bank.GetBinCenter(bin))
-                                    t_point_data = [const_temp, (p_bin - bin)]
-                                    if time not in self.__members__['__T_POINTS__'][bank_label]:
-                                        self.__members__['__T_POINTS__'][bank_label][time] = []
-                                    self.__members__['__T_POINTS__'][bank_label][time].append(t_point_data)
-                                bin = p_bin + self.__members__['__LEAP__']
-                                break
+                bin = 1
+                while True:
+                    position = numpy.searchsorted(starts, bin)
+                    if position == len(starts):
+                        break
+                    bin = int(starts[position])
+                    first_in_pattern = contents[bin]
+                    sampled = contents[bin + 2:nbins:pat_step]
+                    not_constant = numpy.flatnonzero(numpy.abs(sampled - first_in_pattern) >= delta_t)
+                    if len(not_constant) == 0:
+                        bin += 1
+                        continue
+                    p_bin = bin + 2 + int(not_constant[0]) * pat_step
+                    is_pattern = self.__compare_pat_length__(p_bin - bin)
+                    if is_pattern:
+                        # -> store const temp, t_i and Delta_t
+                        const_temp = round(first_in_pattern, 2)
+                        time = int(data_bank.GetBinCenter(bin))
+                        t_point_data = [const_temp, (p_bin - bin)]
+                        if time not in self.__members__['__T_POINTS__'][bank_label]:
+                            self.__members__['__T_POINTS__'][bank_label][time] = []
+                        self.__members__['__T_POINTS__'][bank_label][time].append(t_point_data)
+                    bin = p_bin + leap + 1
 
                                                     
 # 
@@ -639,16 +1278,20 @@ class ITCreator():
         self.__members__ = {
             'class_id'            : 'ITCreator'
            ,'__HVI_H__'           : []
+           ,'__HVI_INDEX__'       : {}
            ,'__IT_HISTOS__'       : {}
            ,'__T_POINTS__'        : {}
            ,'__Status__'          : FAILURE
+           ,'__DELTA_T__'         : 0.3
         }
         self.__doc_fields__ = {
             'class_id'            : """ class name """
            ,'__HVI_H__'           : """ list of histograms with i_hv(t) """
+           ,'__HVI_INDEX__'       : """ label -> [histogram, read-only bin contents] """
             ,'_IT_HISTOS__'       : """ a collection of histograms of i_hv(T) """
            ,'__T_POINTS__'        : """ const temperatures found by the scanner class """
            ,'__Status__'          : """ initialisation status """
+           ,'__DELTA_T__'         : """ max difference of temps allowed in pattern """
         }
         
         hvi_status = FAILURE
@@ -656,6 +1299,7 @@ class ITCreator():
         
         if hvi_histo_list != 'None' and len(hvi_histo_list) != 0:
             self.__members__['__HVI_H__'] = hvi_histo_list
+            self.__index_hvi_histos__()
             hvi_status = SUCCESS            
 
         if temp_points != 'None' and len(temp_points) != 0:
@@ -675,14 +1319,17 @@ class ITCreator():
     def GetITPlots(self):
         return ( self.__members__['__IT_HISTOS__'] )
 
-    def __find_hvi_histo__(self, label):
-        hvi_histo = None
+    # -> label -> series index, built once, the bin contents are shared
+    #    read-only views instead of clones of the histograms
+    def __index_hvi_histos__(self):
+        index = self.__members__['__HVI_INDEX__']
         for histo in self.__members__['__HVI_H__']:
             hvi_label = histo.GetName()[HVI_PREFIX:]
-            if hvi_label == label:
-                hvi_histo = histo.Clone()
-                break
-        return ( hvi_histo )
+            if hvi_label not in index:
+                index[hvi_label] = [histo, histo_view(histo)]
+
+    def __find_hvi_histo__(self, label):
+        return ( self.__members__['__HVI_INDEX__'].get(label) )
 
     def __const_temp_list__(self, time_data):
         const_temps = []
@@ -693,6 +1340,7 @@ class ITCreator():
 
 
     def FindAndIntegrateHVIs(self):
+        from ROOT import TProfile, kFALSE
         T_Points = self.__members__['__T_POINTS__']
         not_valid = ['PU01_AB']
         for sensor_label in T_Points:
@@ -715,10 +1363,12 @@ class ITCreator():
                 self.__members__['__IT_HISTOS__'][sensor_label] = prof
 
                 # -> for each const temp find and integrate hv current
-                hvi_bank = self.__find_hvi_histo__(sensor_label)
-                if hvi_bank == None:
+                hvi_entry = self.__find_hvi_histo__(sensor_label)
+                if hvi_entry == None:
                     print ' --> Problem, hvi data not found for sensor: ', sensor_label
                     continue
+                hvi_bank, hvi_contents = hvi_entry
+                last_bin = len(hvi_contents) - 1
 
                 #######################################################################
                 print ' --> Creating IT plot for sensor: ', sensor_label
@@ -734,10 +1384,15 @@ class ITCreator():
                         time_in_bin = hvi_bank.GetBinCenter(bin_pointer)
                         time_jump = time - time_in_bin
                         bin_pointer += int(time_jump)
-                        for time_bin in range(bin_pointer, bin_pointer + delta_t):
-                            hvi = hvi_bank.GetBinContent(time_bin)
-                            if hvi:
-                                self.__members__['__IT_HISTOS__'][sensor_label].Fill(const_T, hvi)
+                        # -> out of range bins read as under/overflow, like GetBinContent
+                        time_bins = numpy.clip(numpy.arange(bin_pointer, bin_pointer + delta_t), 0, last_bin)
+                        # -> only the window is converted to double for FillN
+                        hvis = hvi_contents[time_bins].astype(numpy.float64)
+                        hvis = hvis[hvis != 0]
+                        if len(hvis):
+                            temps = numpy.empty(len(hvis))
+                            temps.fill(float(const_T))
+                            self.__members__['__IT_HISTOS__'][sensor_label].FillN(len(hvis), temps, hvis, numpy.ones(len(hvis)))
                 self.__members__['__IT_HISTOS__'][sensor_label].SetStats(kFALSE)
                 self.__members__['__IT_HISTOS__'][sensor_label].SetOption("P")
                 self.__members__['__IT_HISTOS__'][sensor_label].SetMarkerSize(0.8)
@@ -746,14 +1401,823 @@ class ITCreator():
                 self.__members__['__IT_HISTOS__'][sensor_label].GetYaxis().SetTitle('HV current mA')
                 self.__members__['__IT_HISTOS__'][sensor_label].GetYaxis().SetLabelSize(0.03)
 
+#
+def __file_chunks__(file_path, chunk_size):
+    ''' Splits the body of a csv file (without the two header rows) into
+        [first, last] byte ranges that start and end at line boundaries '''
+    chunks = []
+    size = os.path.getsize(file_path)
+    raw = open(file_path, 'rb')
+    raw.readline()
+    raw.readline()
+    first = raw.tell()
+    while first < size:
+        raw.seek(min(first + chunk_size, size))
+        raw.readline()
+        last = raw.tell()
+        chunks.append([first, last])
+        first = last
+    raw.close()
+
+    return ( chunks )
+
+#
+def __decode_chunk__(task):
+    ''' Process pool target: decodes the rows of one chunk of a csv file
+        into {channel: [[time, value], ...]}, the task is given as
+        [file path, first byte, last byte, channel names, value width] '''
+    file_path, first, last, channels, width = task
+    raw = open(file_path, 'rb')
+    raw.seek(first)
+    lines = raw.read(last - first).splitlines()
+    raw.close()
+    data = {}
+    tdate = __decode_rows__(csv.reader(lines), channels, width, data)
+
+    return ( tdate, data )
+
+#
+def __decode_rows__(rows, channels, width, data):
+    ''' Appends [time, value] pairs of each csv record to the per channel
+        SampleSeries in data, returns the time stamp of the first record.
+        The YYYY/MM/DD HH:MM:SS.fff stamp is parsed once per record into
+        seconds since the epoch, the value is cut to width characters '''
+    tdate = None
+    days = {}
+    for entry in rows:
+        if len(entry) == 0:
+            continue
+        stamp = entry[0]
+        if tdate == None:
+            tdate = stamp[:19]
+        day = stamp[:10]
+        if day not in days:
+            days[day] = date_translator(day)
+        time = days[day] + int(stamp[11:13])*HOUR + int(stamp[14:16])*MINUTE + int(stamp[17:19])
+        for index in range(1, len(entry) - 1):
+            value = entry[index]
+            if value not in NULL_ENTRIES:
+                channel = channels[index - 1]
+                if channel not in data:
+                    data[channel] = SampleSeries()
+                data[channel].append((time, value[:width]))
+
+    return ( tdate )
+
+#
+class NumpyAxis():
+    """ ------------------------------------------------------------------- """
+    """  Keeps the axis settings of a NumpyHisto until it is converted     """
+    """ ------------------------------------------------------------------- """
+
+    def __init__(self):
+        self.__members__ = {
+            'class_id'          : 'NumpyAxis'
+           ,'__title__'         : ''
+           ,'__label_size__'    : None
+           ,'__range_user__'    : None
+        }
+
+    def SetTitle(self, title):
+        self.__members__['__title__'] = title
+
+    def GetTitle(self):
+        return ( self.__members__['__title__'] )
+
+    def SetLabelSize(self, size):
+        self.__members__['__label_size__'] = size
+
+    def SetRangeUser(self, low, up):
+        self.__members__['__range_user__'] = ( low, up )
+
+    # -> copy the settings onto a ROOT TAxis
+    def apply(self, axis):
+        axis.SetTitle(self.__members__['__title__'])
+        if self.__members__['__label_size__'] != None:
+            axis.SetLabelSize(self.__members__['__label_size__'])
+        if self.__members__['__range_user__'] != None:
+            axis.SetRangeUser(*self.__members__['__range_user__'])
+
+#
+class NumpyHisto():
+    """ ------------------------------------------------------------------- """
+    """  Fixed bin 1D histogram held in a numpy float32 array, it has the   """
+    """  part of the TH1F interface used by the IT scan (same binning,      """
+    """  under-/overflow and bin number clamping), so the analysis runs     """
+    """  without ROOT. toROOT() gives a TH1F for the writing and drawing    """
+    """ ------------------------------------------------------------------- """
+
+    def __init__(self, name, title, nbins, xlow, xup):
+        nbins = int(nbins)
+        self.__members__ = {
+            'class_id'          : 'NumpyHisto'
+           ,'__name__'          : name
+           ,'__title__'         : title
+           ,'__nbins__'         : nbins
+           ,'__xlow__'          : float(xlow)
+           ,'__xup__'           : float(xup)
+           ,'__CONTENTS__'      : numpy.zeros(nbins + 2, dtype = numpy.float32)
+           ,'__VALID__'         : numpy.zeros(nbins + 2, dtype = numpy.bool_)
+           ,'__entries__'       : 0
+           ,'__stats__'         : True
+           ,'__option__'        : ''
+           ,'__X_AXIS__'        : NumpyAxis()
+           ,'__Y_AXIS__'        : NumpyAxis()
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__CONTENTS__'      : """ bin contents, index = bin number, 0 and nbins + 1 are the under-/overflow """
+           ,'__VALID__'         : """ validity mask, True for the bins given a value """
+           ,'__entries__'       : """ number of SetBinContent calls, as counted by TH1 """
+        }
+
+    def GetName(self):
+        return ( self.__members__['__name__'] )
+
+    def GetTitle(self):
+        return ( self.__members__['__title__'] )
+
+    def GetNbinsX(self):
+        return ( self.__members__['__nbins__'] )
+
+    def GetXaxis(self):
+        return ( self.__members__['__X_AXIS__'] )
+
+    def GetYaxis(self):
+        return ( self.__members__['__Y_AXIS__'] )
+
+    def SetStats(self, stats):
+        self.__members__['__stats__'] = bool(stats)
+
+    def SetOption(self, option):
+        self.__members__['__option__'] = option
+
+    def GetEntries(self):
+        return ( self.__members__['__entries__'] )
+
+    # -> the whole contents array, a view and not a copy
+    def GetContents(self):
+        return ( self.__members__['__CONTENTS__'] )
+
+    # -> the validity mask, a view and not a copy
+    def GetValid(self):
+        return ( self.__members__['__VALID__'] )
+
+    def GetBinContent(self, bin):
+        contents = self.__members__['__CONTENTS__']
+        bin = min(max(bin, 0), len(contents) - 1)
+        return ( float(contents[bin]) )
+
+    def SetBinContent(self, bin, content):
+        contents = self.__members__['__CONTENTS__']
+        self.__members__['__entries__'] += 1
+        if bin < 0 or bin >= len(contents):
+            return
+        contents[bin] = content
+        self.__members__['__VALID__'][bin] = True
+
+    # -> replace all the contents, under- and overflow included, like
+    #    TH1::SetContent followed by TH1::SetEntries, the bins in valid
+    #    are marked as given a value
+    def SetContents(self, contents, entries, valid = None):
+        self.__members__['__CONTENTS__'][:] = contents
+        self.__members__['__entries__'] = entries
+        if valid is not None:
+            self.__members__['__VALID__'][valid] = True
+
+    def GetBinCenter(self, bin):
+        width = ( self.__members__['__xup__'] - self.__members__['__xlow__'] ) / self.__members__['__nbins__']
+        return ( self.__members__['__xlow__'] + ( bin - 0.5 ) * width )
+
+    # -> create the TH1F with the same binning, contents and settings
+    def toROOT(self):
+        from ROOT import TH1F
+        histo = TH1F(self.__members__['__name__'], self.__members__['__title__'], self.__members__['__nbins__'],
+                     self.__members__['__xlow__'], self.__members__['__xup__'])
+        histo.SetContent(self.__members__['__CONTENTS__'].astype(numpy.float64))
+        histo.SetEntries(self.__members__['__entries__'])
+        histo.SetStats(self.__members__['__stats__'])
+        histo.SetOption(self.__members__['__option__'])
+        self.__members__['__X_AXIS__'].apply(histo.GetXaxis())
+        self.__members__['__Y_AXIS__'].apply(histo.GetYaxis())
+        return ( histo )
+
+#
+def __root_th1f__(name, title, nbins, xlow, xup):
+    from ROOT import TH1F
+    return ( TH1F(name, title, nbins, xlow, xup) )
+
+HISTO_BACKENDS = { 'numpy': NumpyHisto, 'root': __root_th1f__ }
+
+#
+def book_histo(name, title, nbins, xlow, xup, backend = HISTO_BACKEND):
+    ''' Books a 1D histogram with the chosen backend, 'numpy' (default)
+        or 'root', both give the same TH1F-like interface '''
+    if backend not in HISTO_BACKENDS:
+        raise ValueError(' --> Unknown histogram backend: ' + str(backend))
+    return ( HISTO_BACKENDS[backend](name, title, nbins, xlow, xup) )
+
+#
+def root_histo(histo):
+    ''' ROOT version of a histogram booked by book_histo, TH1 objects
+        are returned unchanged '''
+    if isinstance(histo, NumpyHisto):
+        return ( histo.toROOT() )
+    return ( histo )
+
+#
+class WindowStats():
+    """ ------------------------------------------------------------------- """
+    """  Cumulative sums and sums of squares of a binned series, built once  """
+    """  so that the sum, mean and spread of any window of bins are O(1).   """
+    """  Bins outside the series read as the first/last bin, the same way   """
+    """  TH1::GetBinContent clamps to the under- and overflow bins          """
+    """ ------------------------------------------------------------------- """
+
+    def __init__(self, contents):
+        contents = numpy.asarray(contents, dtype = numpy.float64)
+        self.__members__ = {
+            'class_id'          : 'WindowStats'
+           ,'__CONTENTS__'      : contents
+           ,'__SUM__'           : numpy.concatenate(([0.], numpy.cumsum(contents)))
+           ,'__SUM2__'          : numpy.concatenate(([0.], numpy.cumsum(contents * contents)))
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__CONTENTS__'      : """ bin contents, index = bin number """
+           ,'__SUM__'           : """ cumulative sum, __SUM__[n] = sum of the first n bins """
+           ,'__SUM2__'          : """ cumulative sum of squares """
+        }
+
+    def __window_sum__(self, sums, edge_first, edge_last, first, last):
+        nbins = len(self.__members__['__CONTENTS__'])
+        low = min(max(first, 0), nbins)
+        high = min(max(last, 0), nbins)
+        total = sums[high] - sums[low]
+        if first < 0:
+            total += ( min(last, 0) - first ) * edge_first
+        if last > nbins:
+            total += ( last - max(first, nbins) ) * edge_last
+        return ( float(total) )
+
+    # -> sum of the bins in [first, last)
+    def getSum(self, first, last):
+        if last <= first:
+            return ( 0. )
+        contents = self.__members__['__CONTENTS__']
+        return ( self.__window_sum__(self.__members__['__SUM__'], contents[0], contents[-1], first, last) )
+
+    # -> mean of the bins in [first, last)
+    def getMean(self, first, last):
+        if last <= first:
+            return ( 0. )
+        return ( self.getSum(first, last) / ( last - first ) )
+
+    # -> standard deviation of the bins in [first, last)
+    def getRMS(self, first, last):
+        if last <= first:
+            return ( 0. )
+        contents = self.__members__['__CONTENTS__']
+        sum2 = self.__window_sum__(self.__members__['__SUM2__'], contents[0]**2, contents[-1]**2, first, last)
+        mean = self.getMean(first, last)
+        return ( max(sum2 / ( last - first ) - mean * mean, 0.) ** 0.5 )
+
+#
+def histo_view(histo):
+    ''' Read-only float32 view of the bin contents of a TH1F or a
+        NumpyHisto, including the under- and overflow bins, nothing is
+        copied '''
+    if isinstance(histo, NumpyHisto):
+        view = histo.GetContents().view()
+    else:
+        nbins = histo.GetNbinsX() + 2
+        contents = histo.GetArray()
+        contents.SetSize(nbins)
+        view = numpy.frombuffer(contents, dtype = numpy.float32, count = nbins)
+    view.setflags(write = False)
+    return ( view )
+
+#
+def histo_contents(histo):
+    ''' Bin contents of a TH1F or a NumpyHisto, including the under- and
+        overflow bins, as a numpy array indexed by the bin number '''
+    return ( histo_view(histo).astype(numpy.float64) )
+
+#
+def round_values(values, digits):
+    ''' round(value, digits) of every value in one vectorised step. numpy
+        rounds the scaled values and halves to even, so the few values
+        that sit on a half after scaling are left to round() itself '''
+    values = numpy.asarray(values, dtype = numpy.float64)
+    rounded = numpy.round(values, digits)
+    scaled = values * 10**digits
+    for index in numpy.flatnonzero(numpy.abs(scaled - numpy.floor(scaled) - 0.5) < 1e-6).tolist():
+        rounded[index] = round(values[index], digits)
+
+    return ( rounded )
+
+#
+def fill_histo(histo, bins, values):
+    ''' Bulk SetBinContent of a TH1F or a NumpyHisto: values[k] goes to
+        bin bins[k], the contents are pushed in one call. The result is
+        the one of a SetBinContent loop, the later value wins when a bin
+        is given twice, bins out of range are skipped and every value
+        counts as an entry '''
+    bins = numpy.asarray(bins, dtype = numpy.intp)
+    values = numpy.asarray(values, dtype = numpy.float64)
+    contents = histo_contents(histo)
+    inside = numpy.flatnonzero(( bins >= 0 ) & ( bins < len(contents) ))
+    # -> the last of the values given to the same bin
+    reverse = inside[::-1]
+    unique, first = numpy.unique(bins[reverse], return_index = True)
+    contents[unique] = values[reverse[first]]
+    __set_contents__(histo, contents, histo.GetEntries() + len(bins), unique)
+
+#
+def __set_contents__(histo, contents, entries, valid = None):
+    ''' Replaces the contents of a TH1F or a NumpyHisto in one call, the
+        bins in valid get a reading in the validity mask of a NumpyHisto '''
+    if isinstance(histo, NumpyHisto):
+        histo.SetContents(contents, entries, valid)
+    else:
+        histo.SetContent(contents)
+        histo.SetEntries(entries)
+
+#
+def histo_gaps(histo, first, last):
+    ''' Mask of the bins in [first, last) without a reading: the bins of a
+        NumpyHisto never given a value, or, as a TH1F has no validity mask,
+        the bins of a TH1F at zero '''
+    if isinstance(histo, NumpyHisto):
+        return ( ~histo.GetValid()[first:last] )
+    return ( numpy.abs(histo_contents(histo)[first:last]) < 0.0001 )
+
+#
+def forward_fill_gaps(histo, first, last):
+    ''' Each gap in the bins [first, last) takes the content of the closest
+        bin before it with a reading, bin first - 1 is taken as it is. One
+        vectorised pass, each filled bin counts as an entry and gets a
+        reading in the validity mask like a SetBinContent call, so the
+        filled bins are no gaps any more. Returns the number of bins filled '''
+    contents = histo_contents(histo)
+    gaps = numpy.concatenate(([False], histo_gaps(histo, first, last)))
+    source = numpy.where(gaps, 0, numpy.arange(first - 1, last))
+    numpy.maximum.accumulate(source, out = source)
+    contents[first - 1:last] = contents[source]
+    filled = int(gaps.sum())
+    __set_contents__(histo, contents, histo.GetEntries() + filled, numpy.flatnonzero(gaps) + first - 1)
+
+    return ( filled )
+
+#
+def mark_gaps(histo, sentinel, first, last):
+    ''' Sets the gaps in the bins [first, last) to the sentinel value, for
+        the output only as the analysis reads the gaps from the mask. Each
+        gap counts as an entry, returns the number of gaps '''
+    contents = histo_contents(histo)
+    gaps = histo_gaps(histo, first, last)
+    contents[first:last][gaps] = sentinel
+    marked = int(gaps.sum())
+    __set_contents__(histo, contents, histo.GetEntries() + marked)
+
+    return ( marked )
+
+#
+def join_time_ranges(hv_points, temp_points):
+    ''' Joins the [time_range, i_hv] windows of a sensor with its
+        [time_range, temperature] plateaus on the time range: one dict
+        lookup per window, the first plateau wins when a time range shows
+        up twice. Each i_hv is taken once, at its first window. Returns
+        [i_hv values, temperatures] '''
+    temps = {}
+    for point in temp_points:
+        temps.setdefault(tuple(point[TIME]), point[TEMP])
+    seen = set()
+    hv_values = []
+    t_values = []
+    for point in hv_points:
+        i_hv = point[HVI]
+        if i_hv not in seen:
+            seen.add(i_hv)
+            hv_values.append(i_hv)
+            t_values.append(temps[tuple(point[TIME])])
+
+    return ( [ hv_values, t_values ] )
+
+#
+def it_graph_cuts(IT_DATA, min_current = IT_MIN_CURRENT, max_drop = IT_MAX_DROP):
+    ''' First level filter of the IT graphs, all the sensors in one pass of
+        array operations. IT_DATA holds [i_hv values, temperatures] of each
+        sensor. Currents with abs(i_hv) < min_current are left out; a graph
+        ends at the first current more than max_drop percent below the one
+        before it, which is dropped too (cut = index of that point). With
+        no such drop the cut is the last point. Returns [cut, temperatures,
+        currents] of each sensor, the arrays after the min_current cut '''
+    channels = sorted(IT_DATA)
+    hv = []
+    t = []
+    for channel in channels:
+        hv_values, t_values = IT_DATA[channel]
+        hv.append(numpy.asarray(hv_values, dtype = numpy.float64))
+        t.append(numpy.asarray(t_values, dtype = numpy.float64))
+    sizes = [ len(values) for values in hv ]
+    owner = numpy.repeat(numpy.arange(len(channels)), sizes)
+    hv = numpy.concatenate(hv) if len(hv) else numpy.zeros(0)
+    t = numpy.concatenate(t) if len(t) else numpy.zeros(0)
+    # -> remove very small leakage currents
+    keep = numpy.abs(hv) >= min_current
+    hv, t, owner = hv[keep], t[keep], owner[keep]
+    counts = numpy.bincount(owner, minlength = len(channels))
+    starts = numpy.cumsum(counts) - counts
+    # -> drops between neighbouring points of the same sensor
+    step = hv[1:] - hv[:-1]
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        drop = ( owner[1:] == owner[:-1] ) & ( step < 0 ) & ( 100. * numpy.abs(step / hv[:-1]) > max_drop )
+    positions = numpy.flatnonzero(drop)
+    cuts = numpy.maximum(counts - 1, 0)
+    dropped, first = numpy.unique(owner[positions], return_index = True)
+    cuts[dropped] = positions[first] - starts[dropped]
+    CUTS = {}
+    for index, channel in enumerate(channels):
+        points = slice(starts[index], starts[index] + counts[index])
+        CUTS[channel] = [ int(cuts[index]), t[points], hv[points] ]
+
+    return ( CUTS )
+
+#
+def find_plateaus(values):
+    ''' Run-length encoding of the integer part (truncated like int()) of
+        consecutive values. Returns numpy arrays with the first and the
+        one-past-last index, the length and the mean value of each run. The
+        values of a run are summed in order, as a loop over the points does,
+        so the means round the same way '''
+    values = numpy.asarray(values, dtype = numpy.float64)
+    if len(values) == 0:
+        empty = numpy.zeros(0, dtype = numpy.intp)
+        return ( empty, empty, empty, numpy.zeros(0) )
+    keys = numpy.trunc(values)
+    edges = numpy.flatnonzero(keys[1:] != keys[:-1]) + 1
+    starts = numpy.concatenate(([0], edges))
+    ends = numpy.concatenate((edges, [len(values)]))
+    lengths = ends - starts
+    # -> add.at is unbuffered and goes through the points in order,
+    #    add.reduceat would sum pairwise
+    sums = numpy.zeros(len(starts))
+    numpy.add.at(sums, numpy.repeat(numpy.arange(len(starts)), lengths), values)
+    means = sums / lengths
+
+    return ( starts, ends, lengths, means )
+
+#
+def merge_oscillations(keys, lengths, min_length = 2):
+    ''' Single pass over the runs found by find_plateaus: runs shorter than
+        min_length are dropped and each group of neighbouring runs with the
+        same key is reduced to its longest run (the first one on a tie).
+        Returns the indices of the kept runs '''
+    kept = []
+    last_key = None
+    for run, (key, length) in enumerate(zip(keys.tolist(), lengths.tolist())):
+        if length < min_length:
+            continue
+        if len(kept) and key == last_key:
+            if length > lengths[kept[-1]]:
+                kept[-1] = run
+        else:
+            kept.append(run)
+            last_key = key
+
+    return ( kept )
+
 # 
 def time_translator(time):
-    ''' Takes time in format HH:MM:SS and translates it to seconds '''
+    ''' Takes time in format HH:MM:SS and translates it to seconds,
+        times decoded already as seconds are returned unchanged '''
+    if not isinstance(time, basestring):
+        return ( int(time) )
     time_ = time.split(':')
     bin = int(time_[0])*HOUR + int(time_[1])*MINUTE + int(time_[2])
 
     return ( bin )
 
+#
+def date_translator(date):
+    ''' Takes date in format YYYY/MM/DD and translates it to seconds since the epoch '''
+    return ( calendar.timegm( ( int(date[0:4]), int(date[5:7]), int(date[8:10]), 0, 0, 0 ) ) )
+
+#
+class StepSeries():
+    """ ------------------------------------------------------------------- """
+    """  HV current readings of one channel held as a step function, every  """
+    """  reading is valid until the next one. The running integral is kept  """
+    """  up to date on each append so the mean current of any time window   """
+    """  needs one bisection. The steps are integrated in double precision, """
+    """  the forward filled histograms of the full analysis hold float32    """
+    """  bins, so the means agree with the full analysis to ~1e-5 mA        """
+    """ ------------------------------------------------------------------- """
+
+    def __init__(self):
+        self.__members__ = {
+            'class_id'          : 'StepSeries'
+           ,'__TIMES__'         : [ ]
+           ,'__VALUES__'        : [ ]
+           ,'__INTEGRAL__'      : [ ]
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__TIMES__'         : """ time of each reading [s] """
+           ,'__VALUES__'        : """ HV current of each reading [mA] """
+           ,'__INTEGRAL__'      : """ integral of the step function up to each reading """
+        }
+
+    # -> append a reading, readings must come in time order
+    def append(self, time, value):
+        times = self.__members__['__TIMES__']
+        values = self.__members__['__VALUES__']
+        integral = self.__members__['__INTEGRAL__']
+        if len(times):
+            integral.append(integral[-1] + values[-1] * ( time - times[-1] ))
+        else:
+            integral.append(0.)
+        times.append(time)
+        values.append(value)
+
+    # -> time of the latest reading, None if empty
+    def getLastTime(self):
+        if len(self.__members__['__TIMES__']) == 0:
+            return ( None )
+        return ( self.__members__['__TIMES__'][-1] )
+
+    def __integral__(self, time):
+        times = self.__members__['__TIMES__']
+        index = max(bisect.bisect_right(times, time) - 1, 0)
+        return ( self.__members__['__INTEGRAL__'][index] + self.__members__['__VALUES__'][index] * ( time - times[index] ) )
+
+    # -> mean current in the time window [first, last)
+    def getMean(self, first, last):
+        if last <= first or len(self.__members__['__TIMES__']) == 0:
+            return ( 0. )
+        return ( ( self.__integral__(last) - self.__integral__(first) ) / ( last - first ) )
+
+#
+class LivePlateaus():
+    """ ------------------------------------------------------------------- """
+    """  Temperature plateaus of one sensor found while the data arrives.   """
+    """  Only the still open (last) run is searched again when new points   """
+    """  come in, runs closed before are never touched. Closed runs go      """
+    """  through the oscillation filter of merge_oscillations one by one    """
+    """ ------------------------------------------------------------------- """
+
+    def __init__(self, min_length = 2):
+        self.__members__ = {
+            'class_id'          : 'LivePlateaus'
+           ,'__min_length__'    : min_length
+           ,'__open__'          : 0
+           ,'__TIMES__'         : [ ]
+           ,'__VALUES__'        : [ ]
+           ,'__STABLE__'        : [ ]
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__min_length__'    : """ shorter runs are dropped as oscillations """
+           ,'__open__'          : """ index of the first point of the open run """
+           ,'__TIMES__'         : """ time of each temperature point [s] """
+           ,'__VALUES__'        : """ temperature of each point [C] """
+           ,'__STABLE__'        : """ [[time_start, time_end], mean, length, key] of the stable runs """
+        }
+
+    # -> append [time, value] points, returns the number of runs closed
+    def extend(self, points):
+        if len(points) == 0:
+            return ( 0 )
+        times = self.__members__['__TIMES__']
+        values = self.__members__['__VALUES__']
+        for time, value in points:
+            times.append(time)
+            values.append(float(value))
+        offset = self.__members__['__open__']
+        starts, ends, lengths, means = find_plateaus(values[offset:])
+        for run in range(len(starts) - 1):
+            self.__close__(offset + int(starts[run]), offset + int(ends[run]))
+        self.__members__['__open__'] = offset + int(starts[-1])
+
+        return ( len(starts) - 1 )
+
+    def __close__(self, start, end):
+        values = self.__members__['__VALUES__']
+        times = self.__members__['__TIMES__']
+        length = end - start
+        if length < self.__members__['__min_length__']:
+            return
+        # -> summed in time order, rounds like the full analysis
+        mean = sum(values[start:end]) / length
+        key = int(values[start])
+        stable = self.__members__['__STABLE__']
+        run = [[times[start], times[end - 1]], round(mean, 2), length, key]
+        if len(stable) and stable[-1][3] == key:
+            if length > stable[-1][2]:
+                stable[-1] = run
+        else:
+            stable.append(run)
+
+    # -> [[time_start, time_end], mean temperature] of the stable runs
+    def getStable(self):
+        return ( [ [run[0], run[1]] for run in self.__members__['__STABLE__'] ] )
+
+#
+class ScanFollower():
+    """ ------------------------------------------------------------------- """
+    """  Follows the data files of a scan that is still running. Each poll  """
+    """  reads only the complete lines written since the previous poll,     """
+    """  appends them to the per channel series, closes the temperature     """
+    """  plateaus that ended and gives the IT points of the sensors that    """
+    """  changed. Files that show up during the scan are picked up too      """
+    """ ------------------------------------------------------------------- """
+
+    def __init__(self, data_path, map_file = CHANNEL_MAP_FILE, bad_channels = ()):
+        self.__members__ = {
+            'class_id'          : 'ScanFollower'
+           ,'__path__'          : ''
+           ,'__status__'        : None
+           ,'__map__'           : None
+           ,'__bad__'           : bad_channels
+           ,'__TAILS__'         : { }
+           ,'__SKIPPED__'       : set()
+           ,'__HVI__'           : { }
+           ,'__TEMP__'          : { }
+           ,'__POINTS__'        : { }
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__path__'          : """ path to the growing data files """
+           ,'__status__'        : """ processing status """
+           ,'__map__'           : """ VeloChannelMap, HV channel of each sensor """
+           ,'__bad__'           : """ sensors left out of the IT points """
+           ,'__TAILS__'         : """ [signature, channels, width, offset] of each followed file """
+           ,'__SKIPPED__'       : """ files not understood by any of the decoders """
+           ,'__HVI__'           : """ StepSeries of each HV channel """
+           ,'__TEMP__'          : """ LivePlateaus of each sensor """
+           ,'__POINTS__'        : """ [[time_start, time_end], T, i_hv] IT points of each sensor """
+        }
+
+        if data_path != None and data_path != '' and os.path.exists(data_path):
+            self.__members__['__path__'] = data_path
+            self.__members__['__map__'] = get_channel_map(map_file)
+            self.__members__['__status__'] = SUCCESS
+        else:
+            print " --> Fatal problem! Given data path: ", data_path
+            print "     is INVALID!!  Processing is terminated! "
+            self.__members__['__status__'] = FAILURE
+
+    # -> check the follower status
+    # ----------------------------
+    def getStatus(self):
+        return ( self.__members__['__status__'] )
+
+    # -> class name
+    # -------------
+    def getName(self):
+        return ( self.__members__['class_id'] )
+
+    # -> files followed so far
+    # ------------------------
+    def getFiles(self):
+        return ( sorted(self.__members__['__TAILS__']) )
+
+    # -> sensors with at least one IT point
+    # -------------------------------------
+    def getLabels(self):
+        return ( sorted(label for label in self.__members__['__POINTS__'] if len(self.__members__['__POINTS__'][label])) )
+
+    # -> IT points of the sensor, in time order
+    # -----------------------------------------
+    def getPoints(self, label):
+        return ( self.__members__['__POINTS__'].get(label, []) )
+
+    # -> IT points up to the warmest plateau so far, the rising edge
+    #    the full analysis fits once the scan is over
+    # --------------------------------------------------------------
+    def getRising(self, label):
+        points = self.getPoints(label)
+        if len(points) == 0:
+            return ( [] )
+        warmest = max((point[TEMP], index) for index, point in enumerate(points))[1]
+        return ( points[:warmest + 1] )
+
+    # -> read what has been written since the last poll, returns
+    #    the sensors whose IT points changed
+    # ----------------------------------------------------------
+    def poll(self):
+        if self.__members__['__status__'] != SUCCESS:
+            return ( [] )
+        self.__discover__()
+        hv_data = {}
+        temp_data = {}
+        for file in sorted(self.__members__['__TAILS__']):
+            signature = self.__members__['__TAILS__'][file][0]
+            if signature == HVI_SIGNATURE:
+                self.__read__(file, hv_data)
+            else:
+                self.__read__(file, temp_data)
+        __map__ = self.__members__['__map__']
+        changed = set()
+        for channel in hv_data:
+            if channel not in self.__members__['__HVI__']:
+                self.__members__['__HVI__'][channel] = StepSeries()
+            series = self.__members__['__HVI__'][channel]
+            for time, value in hv_data[channel]:
+                value = float(value)
+                # -> readings at zero are gaps, the previous reading holds
+                if abs(value) < 0.0001:
+                    continue
+                series.append(time, value)
+            if __map__.hasHVChannel(channel):
+                changed.add(__map__.byHVChannel(channel)[MAP_LABEL])
+        for label in temp_data:
+            if label not in self.__members__['__TEMP__']:
+                self.__members__['__TEMP__'][label] = LivePlateaus()
+            if self.__members__['__TEMP__'][label].extend(temp_data[label]):
+                changed.add(label)
+        updated = []
+        for label in sorted(changed):
+            if label in self.__members__['__bad__'] or label not in self.__members__['__TEMP__']:
+                continue
+            points = self.__it_points__(label)
+            if points != self.__members__['__POINTS__'].get(label, []):
+                self.__members__['__POINTS__'][label] = points
+                updated.append(label)
+
+        return ( updated )
+
+    # -> start following the data files that showed up since the last
+    #    poll, a file is taken once both header rows are complete
+    # ---------------------------------------------------------------
+    def __discover__(self):
+        __path__ = self.__members__['__path__']
+        for file in sorted(os.listdir(__path__)):
+            if file in self.__members__['__TAILS__'] or file in self.__members__['__SKIPPED__']:
+                continue
+            if not os.path.isfile(__path__ + '/' + file):
+                continue
+            try:
+                raw = open(__path__ + '/' + file, 'rb')
+                line_1 = raw.readline()
+                line_2 = raw.readline()
+                offset = raw.tell()
+                raw.close()
+            except IOError:
+                print ' --> Problem with reading data file: ', file
+                continue
+            if not line_2.endswith('\n'):
+                continue
+            try:
+                head_1, head_2 = list(csv.reader([line_1, line_2]))
+            except (ValueError, csv.Error):
+                self.__members__['__SKIPPED__'].add(file)
+                continue
+            signature = __scan_signature__(head_1)
+            if signature == None:
+                self.__members__['__SKIPPED__'].add(file)
+                continue
+            channels, width = __header_channels__(signature, head_1, head_2)
+            self.__members__['__TAILS__'][file] = [signature, channels, width, offset]
+
+    # -> decode the complete lines appended to the file since the last
+    #    read, a line still being written is left for the next poll
+    # ----------------------------------------------------------------
+    def __read__(self, file, data):
+        tail = self.__members__['__TAILS__'][file]
+        signature, channels, width, offset = tail
+        raw = open(self.__members__['__path__'] + '/' + file, 'rb')
+        raw.seek(offset)
+        chunk = raw.read()
+        raw.close()
+        end = chunk.rfind('\n') + 1
+        if end == 0:
+            return
+        tail[3] = offset + end
+        __decode_rows__(csv.reader(chunk[:end].splitlines()), channels, width, data)
+
+    # -> mean HV current over each stable plateau of the sensor, only
+    #    plateaus the HV readings already cover make an IT point
+    # ---------------------------------------------------------------
+    def __it_points__(self, label):
+        __map__ = self.__members__['__map__']
+        if not __map__.hasLabel(label):
+            return ( [] )
+        series = self.__members__['__HVI__'].get(__map__.byLabel(label)[MAP_HV_CHANNEL])
+        if series == None or series.getLastTime() == None:
+            return ( [] )
+        points = []
+        for time_range, mean in self.__members__['__TEMP__'][label].getStable():
+            time_start, time_end = time_range
+            if int(mean) < FOLLOW_MIN_TEMP or time_end <= time_start:
+                continue
+            if time_end > series.getLastTime():
+                break
+            points.append([time_range, mean, round(series.getMean(time_start, time_end), 5)])
+
+        return ( points )
+
 #
 class VeloDetectorElement():
     """ ------------------------------------------------------------------- """
@@ -761,122 +2225,15 @@ class VeloDetectorElement():
     """  and sensor type R = 1, Phi = 0                                     """
     """ ------------------------------------------------------------------- """
 
-    def __init__(self):
+    def __init__(self, map_file = CHANNEL_MAP_FILE):
         self.__members__ = {
             'class_id'      : 'VeloDetectorElement'
-           ,'__Velo_Det__'  : { }
-        }
-        self.__createMap__()
-        self._HV_CHANNEL = 0
-        self._SENSOR = 1
-        self._Z = 2
-        self._SENSOR_TYPE = 3
-
-    def __createMap__(self):
-        # -> header data have format as follow: maXX/chXX
-        #    map will relate hardware channels with labels and sensors
-        # ----------------------
-        # -> side C, HV_Board00
-        self.__members__['__Velo_Det__']['PU01_CT'] = ['ma06/ch00', 129, -300., 1]
-        self.__members__['__Velo_Det__']['PU02_CB'] = ['ma06/ch01', 131, -220., 1]
-        self.__members__['__Velo_Det__']['VL01_CT'] = ['ma06/ch02', 65, -160., 0]
-        self.__members__['__Velo_Det__']['VL01_CB'] = ['ma06/ch03', 1, -160., 1]
-        self.__members__['__Velo_Det__']['VL02_CT'] = ['ma06/ch04', 3, -130., 1]
-        self.__members__['__Velo_Det__']['VL02_CB'] = ['ma06/ch05', 67, -130., 0]
-        self.__members__['__Velo_Det__']['VL03_CT'] = ['ma06/ch06', 69, -100., 0]
-        self.__members__['__Velo_Det__']['VL03_CB'] = ['ma06/ch07', 5, -100., 1]
-        # -> side C, HV_Board01
-        self.__members__['__Velo_Det__']['VL04_CT'] = ['ma07/ch00', 7, 70., 1]
-        self.__members__['__Velo_Det__']['VL04_CB'] = ['ma07/ch01', 71, -70.,0]
-        self.__members__['__Velo_Det__']['VL05_CT'] = ['ma07/ch02', 73, -40., 0]
-        self.__members__['__Velo_Det__']['VL05_CB'] = ['ma07/ch03', 9, -40., 1]
-        self.__members__['__Velo_Det__']['VL06_CT'] = ['ma07/ch04', 11, -10., 1]
-        self.__members__['__Velo_Det__']['VL06_CB'] = ['ma07/ch05', 75, -10., 0]
-        self.__members__['__Velo_Det__']['VL07_CT'] = ['ma07/ch06', 77, 20., 0]
-        self.__members__['__Velo_Det__']['VL07_CB'] = ['ma07/ch07', 13, 20., 1]
-        # -> side C, HV_Board02
-        self.__members__['__Velo_Det__']['VL08_CT'] = ['ma08/ch00', 15, 50., 1]
-        self.__members__['__Velo_Det__']['VL08_CB'] = ['ma08/ch01', 79, 50., 0]
-        self.__members__['__Velo_Det__']['VL09_CT'] = ['ma08/ch02', 81, 80., 0]
-        self.__members__['__Velo_Det__']['VL09_CB'] = ['ma08/ch03', 17, 80., 1]
-        self.__members__['__Velo_Det__']['VL10_CT'] = ['ma08/ch04', 19, 80., 1]
-        self.__members__['__Velo_Det__']['VL10_CB'] = ['ma08/ch05', 83, 110., 0]
-        self.__members__['__Velo_Det__']['VL11_CT'] = ['ma08/ch06', 85, 140., 0]
-        self.__members__['__Velo_Det__']['VL11_CB'] = ['ma08/ch07', 21, 140., 1]
-        # -> side C, HV_Board03
-        self.__members__['__Velo_Det__']['VL12_CT'] = ['ma09/ch00', 23, 170., 1]
-        self.__members__['__Velo_Det__']['VL12_CB'] = ['ma09/ch01', 87, 170., 0]
-        self.__members__['__Velo_Det__']['VL13_CT'] = ['ma09/ch02', 89, 200., 0]
-        self.__members__['__Velo_Det__']['VL13_CB'] = ['ma09/ch03', 25, 200., 1]
-        self.__members__['__Velo_Det__']['VL14_CT'] = ['ma09/ch04', 27, 230., 1]
-        self.__members__['__Velo_Det__']['VL14_CB'] = ['ma09/ch05', 91, 230., 0]
-        self.__members__['__Velo_Det__']['VL15_CT'] = ['ma09/ch06', 93, 260., 0]
-        self.__members__['__Velo_Det__']['VL15_CB'] = ['ma09/ch07', 29, 260., 1]
-        # -> side C, HV_Board04
-        self.__members__['__Velo_Det__']['VL16_CT'] = ['ma10/ch00', 31, 290., 1]
-        self.__members__['__Velo_Det__']['VL16_CB'] = ['ma10/ch01', 95, 290., 0]
-        self.__members__['__Velo_Det__']['VL19_CT'] = ['ma10/ch02', 97, 450., 0]
-        self.__members__['__Velo_Det__']['VL19_CB'] = ['ma10/ch03', 33, 450., 1]
-        self.__members__['__Velo_Det__']['VL22_CT'] = ['ma10/ch04', 35, 600., 1]
-        self.__members__['__Velo_Det__']['VL22_CB'] = ['ma10/ch05', 99, 600., 0]
-        self.__members__['__Velo_Det__']['VL23_CT'] = ['ma10/ch06', 101, 650., 0]
-        self.__members__['__Velo_Det__']['VL23_CB'] = ['ma10/ch07', 37, 650., 1]
-        # -> side C, HV_Board05
-        self.__members__['__Velo_Det__']['VL24_CT'] = ['ma11/ch00', 39, 700., 1]
-        self.__members__['__Velo_Det__']['VL24_CB'] = ['ma11/ch01', 103, 700., 0]
-        self.__members__['__Velo_Det__']['VL25_CT'] = ['ma11/ch02', 105, 750., 0]
-        self.__members__['__Velo_Det__']['VL25_CB'] = ['ma11/ch03', 41, 750., 1]
-        # ----------------------
-        # -> side A, HV_Board00
-        self.__members__['__Velo_Det__']['PU01_AT'] = ['ma00/ch00', 130, -315., 1]
-        self.__members__['__Velo_Det__']['PU02_AB'] = ['ma00/ch01', 128, -235., 1]
-        self.__members__['__Velo_Det__']['VL01_AT'] = ['ma00/ch02', 64, -175., 0]
-        self.__members__['__Velo_Det__']['VL01_AB'] = ['ma00/ch03', 0, -175., 1]
-        self.__members__['__Velo_Det__']['VL02_AT'] = ['ma00/ch04', 2, -145., 1]
-        self.__members__['__Velo_Det__']['VL02_AB'] = ['ma00/ch05', 66, -145., 0]
-        self.__members__['__Velo_Det__']['VL03_AT'] = ['ma00/ch06', 68, -115., 0]
-        self.__members__['__Velo_Det__']['VL03_AB'] = ['ma00/ch07', 4, -115., 1]
-        # -> side A, HV_Board01
-        self.__members__['__Velo_Det__']['VL04_AT'] = ['ma01/ch00', 6, -85., 1]
-        self.__members__['__Velo_Det__']['VL04_AB'] = ['ma01/ch01', 70, -85., 0]
-        self.__members__['__Velo_Det__']['VL05_AT'] = ['ma01/ch02', 72, -55., 0]
-        self.__members__['__Velo_Det__']['VL05_AB'] = ['ma01/ch03', 8, -55., 1]
-        self.__members__['__Velo_Det__']['VL06_AT'] = ['ma01/ch04', 10, -25., 1]
-        self.__members__['__Velo_Det__']['VL06_AB'] = ['ma01/ch05', 74, -25., 0]
-        self.__members__['__Velo_Det__']['VL07_AT'] = ['ma01/ch06', 76, 5., 0]
-        self.__members__['__Velo_Det__']['VL07_AB'] = ['ma01/ch07', 12, 5., 1]
-        # -> side A, HV_Board02
-        self.__members__['__Velo_Det__']['VL08_AT'] = ['ma02/ch00', 14, 35., 1]
-        self.__members__['__Velo_Det__']['VL08_AB'] = ['ma02/ch01', 78, 35., 0]
-        self.__members__['__Velo_Det__']['VL09_AT'] = ['ma02/ch02', 80, 65., 0]
-        self.__members__['__Velo_Det__']['VL09_AB'] = ['ma02/ch03', 16, 65., 1]
-        self.__members__['__Velo_Det__']['VL10_AT'] = ['ma02/ch04', 18, 95., 1]
-        self.__members__['__Velo_Det__']['VL10_AB'] = ['ma02/ch05', 82, 95., 0]
-        self.__members__['__Velo_Det__']['VL11_AT'] = ['ma02/ch06', 84, 125., 0]
-        self.__members__['__Velo_Det__']['VL11_AB'] = ['ma02/ch07', 20, 125., 1]
-        # -> side C, HV_Board03
-        self.__members__['__Velo_Det__']['VL12_AT'] = ['ma03/ch00', 22, 155., 1]
-        self.__members__['__Velo_Det__']['VL12_AB'] = ['ma03/ch01', 86, 155., 0]
-        self.__members__['__Velo_Det__']['VL13_AT'] = ['ma03/ch02', 88, 185., 0]
-        self.__members__['__Velo_Det__']['VL13_AB'] = ['ma03/ch03', 24, 185., 1]
-        self.__members__['__Velo_Det__']['VL14_AT'] = ['ma03/ch04', 26, 215., 1]
-        self.__members__['__Velo_Det__']['VL14_AB'] = ['ma03/ch05', 90, 215., 0]
-        self.__members__['__Velo_Det__']['VL15_AT'] = ['ma03/ch06', 92, 245., 0]
-        self.__members__['__Velo_Det__']['VL15_AB'] = ['ma03/ch07', 28, 245., 1]
-        # -> side A, HV_Board04
-        self.__members__['__Velo_Det__']['VL16_AT'] = ['ma04/ch00', 30, 275., 1]
-        self.__members__['__Velo_Det__']['VL16_AB'] = ['ma04/ch01', 94, 305., 0]
-        self.__members__['__Velo_Det__']['VL19_AT'] = ['ma04/ch02', 96, 435., 0]
-        self.__members__['__Velo_Det__']['VL19_AB'] = ['ma04/ch03', 32, 435., 1]
-        self.__members__['__Velo_Det__']['VL22_AT'] = ['ma04/ch04', 34, 585., 1]
-        self.__members__['__Velo_Det__']['VL22_AB'] = ['ma04/ch05', 98, 585., 0]
-        self.__members__['__Velo_Det__']['VL23_AT'] = ['ma04/ch06', 100, 635., 0]
-        self.__members__['__Velo_Det__']['VL23_AB'] = ['ma04/ch07', 36, 635., 1]
-        # -> side A, HV_Board05
-        self.__members__['__Velo_Det__']['VL24_AT'] = ['ma05/ch00', 38, 685., 1]
-        self.__members__['__Velo_Det__']['VL24_AB'] = ['ma05/ch01', 102, 685., 0]
-        self.__members__['__Velo_Det__']['VL25_AT'] = ['ma05/ch02', 104, 735., 0]
-        self.__members__['__Velo_Det__']['VL25_AB'] = ['ma05/ch03', 40, 735., 1]
+           ,'__Velo_Det__'  : get_channel_map(map_file)
+        }
+        self._HV_CHANNEL = MAP_HV_CHANNEL
+        self._SENSOR = MAP_SENSOR
+        self._Z = MAP_Z
+        self._SENSOR_TYPE = MAP_TYPE
 
     @property
     def HV_CHANNEL(self):
@@ -896,19 +2253,28 @@ class VeloDetectorElement():
 
     # -> translate sensor name to hv module channel
     def sensor_name2hv_channel(self, name):
-        return ( self.__members__['__Velo_Det__'][name][self.HV_CHANNEL] )
+        return ( self.__members__['__Velo_Det__'].byLabel(name)[self.HV_CHANNEL] )
 
     # -> get sensor number for a given sensor name
     def sensor_name2sensor_number(self, name):
-        return ( self.__members__['__Velo_Det__'][name][self.SENSOR] )
+        return ( self.__members__['__Velo_Det__'].byLabel(name)[self.SENSOR] )
 
     # -> get z position for a given sensor name
     def sensor_name2sensor_z(self, name):
-        return ( self.__members__['__Velo_Det__'][name][self.Z] )
+        return ( self.__members__['__Velo_Det__'].byLabel(name)[self.Z] )
 
     # -> get sensor type for a given sensor name
     def sensor_name2sensor_type(self, name):
-        return ( self.__members__['__Velo_Det__'][name][self.SENSOR_TYPE] )
+        return ( self.__members__['__Velo_Det__'].byLabel(name)[self.SENSOR_TYPE] )
+
+#
+def check_root_env():
+    ''' Returns True if the LHCb and ROOT environment is set, ROOT itself
+        is imported only by the stages that draw, fit or write out '''
+    for variable in ('LHCBSYSROOT', 'ROOTSYS'):
+        if os.environ.get(variable) in (None, ''):
+            return ( False )
+    return ( True )
 
 #
 def set_root_env():
@@ -927,6 +2293,171 @@ def set_root_env():
     gStyle.SetLineColor(1)
     gStyle.SetLineWidth(1)
 
+#
+def batch_levenberg_marquardt(model, jacobian, x, y, params, weights, max_iter = 100, tolerance = 1e-10):
+    ''' Levenberg-Marquardt least squares fits of many problems at once, the
+        damping is scaled by the diagonal of J^T W J and kept per problem.
+        x, y and weights are (problems, points) arrays, padded points get a
+        zero weight. params is (problems, params), model(x, params) returns
+        (problems, points) and jacobian (problems, points, params).
+        Returns [params, covariance = (J^T W J)^-1, chi2, converged,
+        iterations], each with one row per problem '''
+    x = numpy.asarray(x, dtype = numpy.float64)
+    y = numpy.asarray(y, dtype = numpy.float64)
+    weights = numpy.asarray(weights, dtype = numpy.float64)
+    params = numpy.array(params, dtype = numpy.float64)
+    problems, npar = params.shape
+    identity = numpy.eye(npar)
+
+    def __normal_equations__(params, residuals):
+        jac = jacobian(x, params)
+        weighted = jac * weights[:, :, None]
+        alpha = numpy.einsum('kni,knj->kij', weighted, jac)
+        beta = numpy.einsum('kni,kn->ki', weighted, residuals)
+        # -> problems without data get a harmless unit matrix
+        empty = ~numpy.any(alpha.reshape(problems, -1) != 0., axis = 1)
+        alpha[empty] = identity
+        return ( alpha, beta )
+
+    residuals = y - model(x, params)
+    chi2 = numpy.sum(weights * residuals * residuals, axis = 1)
+    damping = numpy.ones(problems) * 1e-3
+    converged = numpy.zeros(problems, dtype = bool)
+    iterations = numpy.zeros(problems, dtype = int)
+    active = numpy.isfinite(chi2)
+    alpha, beta = __normal_equations__(params, residuals)
+    while numpy.any(active):
+        # -> one trial step for every active problem, each with its damping
+        damped = alpha + damping[:, None, None] * ( alpha * identity )
+        damped[~active] = identity
+        try:
+            step = numpy.linalg.solve(damped, beta[:, :, None])[:, :, 0]
+        except numpy.linalg.LinAlgError:
+            step = numpy.einsum('kij,kj->ki', numpy.linalg.pinv(damped), beta)
+        step[~active] = 0.
+        new_params = params + step
+        new_residuals = y - model(x, new_params)
+        new_chi2 = numpy.sum(weights * new_residuals * new_residuals, axis = 1)
+        improved = active & numpy.isfinite(new_chi2) & ( new_chi2 <= chi2 )
+        rejected = active & ~improved
+        # -> rejected steps: more damping, no downhill step left means minimum
+        damping[rejected] *= 10.
+        stuck = rejected & ( damping >= 1e12 )
+        converged[stuck] = True
+        active[stuck] = False
+        # -> accepted steps
+        if numpy.any(improved):
+            delta_chi2 = chi2 - new_chi2
+            params[improved] = new_params[improved]
+            residuals[improved] = new_residuals[improved]
+            chi2[improved] = new_chi2[improved]
+            damping[improved] = numpy.maximum(damping[improved] / 10., 1e-12)
+            iterations[improved] += 1
+            done = improved & ( delta_chi2 <= tolerance * chi2 )
+            converged[done] = True
+            active[done | ( iterations >= max_iter )] = False
+            new_alpha, new_beta = __normal_equations__(params, residuals)
+            alpha[improved] = new_alpha[improved]
+            beta[improved] = new_beta[improved]
+    alpha, beta = __normal_equations__(params, residuals)
+    covariance = numpy.linalg.pinv(alpha)
+
+    return ( [ params, covariance, chi2, converged, iterations ] )
+
+#
+class FitResult():
+    """ ------------------------------------------------------------------- """
+    """  Result of the NumPy fit of an IT graph, answers like the TF1 kept  """
+    """  in FIT_LIBRARY (GetParameter, GetChisquare, Eval, Draw...). The    """
+    """  TF1 is made from a formula only when the fit is drawn or written   """
+    """ ------------------------------------------------------------------- """
+
+    def __init__(self, name, model, params, covariance, chi2, ndf, converged, tmin, tmax, iterations = 0):
+        self.__members__ = {
+            'class_id'          : 'FitResult'
+           ,'__name__'          : name
+           ,'__model__'         : model
+           ,'__PARAMS__'        : numpy.asarray(params, dtype = numpy.float64)
+           ,'__COVARIANCE__'    : numpy.asarray(covariance, dtype = numpy.float64)
+           ,'__chi2__'          : chi2
+           ,'__ndf__'           : ndf
+           ,'__converged__'     : converged
+           ,'__iterations__'    : iterations
+           ,'__range__'         : ( tmin, tmax )
+           ,'__TF1__'           : None
+        }
+        self.__doc_fields__ = {
+            'class_id'          : """ class name """
+           ,'__model__'         : """ vectorised model(t, params) """
+           ,'__PARAMS__'        : """ A, B, E_g """
+           ,'__COVARIANCE__'    : """ covariance matrix of A, B, E_g """
+           ,'__TF1__'           : """ ROOT function, made on the first Draw/Write """
+        }
+
+    def GetName(self):
+        return ( self.__members__['__name__'] )
+
+    def GetNpar(self):
+        return ( len(self.__members__['__PARAMS__']) )
+
+    def GetParName(self, index):
+        return ( FIT_PAR_NAMES[index] )
+
+    def GetParameter(self, index):
+        return ( float(self.__members__['__PARAMS__'][index]) )
+
+    def GetParameters(self):
+        return ( self.__members__['__PARAMS__'].copy() )
+
+    def GetParError(self, index):
+        return ( float(numpy.sqrt(max(self.__members__['__COVARIANCE__'][index, index], 0.))) )
+
+    def GetCovariance(self):
+        return ( self.__members__['__COVARIANCE__'].copy() )
+
+    def GetChisquare(self):
+        return ( self.__members__['__chi2__'] )
+
+    def GetNDF(self):
+        return ( self.__members__['__ndf__'] )
+
+    def IsValid(self):
+        return ( self.__members__['__converged__'] )
+
+    def GetIterations(self):
+        return ( self.__members__['__iterations__'] )
+
+    def GetXmin(self):
+        return ( self.__members__['__range__'][0] )
+
+    def GetXmax(self):
+        return ( self.__members__['__range__'][1] )
+
+    def Eval(self, t):
+        return ( self.__members__['__model__'](t, self.__members__['__PARAMS__']) )
+
+    # -> TF1 with the fitted parameters, no python callback involved
+    def toROOT(self):
+        if self.__members__['__TF1__'] == None:
+            from ROOT import TF1
+            formula = '[0]*(1+[1]*(x+%r)^2*exp(-[2]/(%r*(x+%r))))' % (ZERO_CELSIUS, 2. * BOLTZMANN, ZERO_CELSIUS)
+            tmin, tmax = self.__members__['__range__']
+            function = TF1(self.__members__['__name__'], formula, tmin, tmax)
+            function.SetParNames(*FIT_PAR_NAMES)
+            for index in range(self.GetNpar()):
+                function.SetParameter(index, self.GetParameter(index))
+                function.SetParError(index, self.GetParError(index))
+            function.SetChisquare(self.__members__['__chi2__'])
+            function.SetNDF(self.__members__['__ndf__'])
+            self.__members__['__TF1__'] = function
+        return ( self.__members__['__TF1__'] )
+
+    def Draw(self, option = ''):
+        self.toROOT().Draw(option)
+
+    def Write(self, name = ''):
+        self.toROOT().Write(name)
+
 #
 class FitModel():
     """ ------------------------------------------------------------------- """
@@ -982,3 +2513,110 @@ class FitModel():
         fit_model = TF1( fit_name, self.py_model, self.TMIN, self.TMAX, self.PARAMS )
         fit_model.SetParNames('A','B','E_{g}')
         return ( fit_model )
+
+    # -> the model on an array of temperatures [deg C] in one go
+    def np_model(self, t, par):
+        T = numpy.asarray(t, dtype = numpy.float64) + ZERO_CELSIUS
+        return ( par[0] * ( 1 + par[1] * T * T * numpy.exp(-par[2] / ( 2. * BOLTZMANN * T )) ) )
+
+    # -> the fit runs on (A, ln(A*B), E_g): I = A + exp(ln(A*B) + 2 ln T - E_g/2kT),
+    #    B and E_g are strongly correlated in the original parameters.
+    #    t is a (channels, points) array and q a (channels, 3) one
+    def __fit_model__(self, t, q):
+        T = t + ZERO_CELSIUS
+        return ( q[:, 0, None] + numpy.exp(q[:, 1, None] + 2. * numpy.log(T) - q[:, 2, None] / ( 2. * BOLTZMANN * T )) )
+
+    def __fit_jacobian__(self, t, q):
+        T = t + ZERO_CELSIUS
+        leakage = numpy.exp(q[:, 1, None] + 2. * numpy.log(T) - q[:, 2, None] / ( 2. * BOLTZMANN * T ))
+        return ( numpy.stack((numpy.ones(T.shape), leakage, -leakage / ( 2. * BOLTZMANN * T )), axis = -1) )
+
+    # -> starting point: with E_g fixed I is linear in A and A*B, the 2x2
+    #    weighted normal equations are solved for all channels together
+    def __fit_start__(self, t, i_hv, weights):
+        T = t + ZERO_CELSIUS
+        shape = T * T * numpy.exp(-E_G_START / ( 2. * BOLTZMANN * T ))
+        s_1 = numpy.sum(weights, axis = 1)
+        s_g = numpy.sum(weights * shape, axis = 1)
+        s_gg = numpy.sum(weights * shape * shape, axis = 1)
+        s_y = numpy.sum(weights * i_hv, axis = 1)
+        s_gy = numpy.sum(weights * shape * i_hv, axis = 1)
+        det = s_1 * s_gg - s_g * s_g
+        det = numpy.where(det != 0., det, 1.)
+        A = ( s_gg * s_y - s_g * s_gy ) / det
+        AB = ( s_1 * s_gy - s_g * s_y ) / det
+        # -> unphysical solutions: A from the lowest current, A*B from the highest
+        used = weights > 0.
+        lowest = numpy.min(numpy.where(used, numpy.abs(i_hv), numpy.inf), axis = 1)
+        A = numpy.where(A > 0., A, 0.5 * numpy.where(numpy.isfinite(lowest), lowest, 1.))
+        top = numpy.argmax(numpy.where(used, i_hv, -numpy.inf), axis = 1)
+        rows = numpy.arange(len(A))
+        AB_top = numpy.maximum(i_hv[rows, top] - A, 1e-12) / numpy.maximum(shape[rows, top], 1e-300)
+        AB = numpy.where(AB > 0., AB, AB_top)
+        return ( numpy.column_stack((A, numpy.log(AB), numpy.ones(len(A)) * E_G_START)) )
+
+    def fit_batch(self, points, ranges = None, errors = None, prefix = 'fit_'):
+        ''' Fits all the channels together. points is {channel: [t, i_hv]},
+            the arrays may have different lengths. ranges {channel: (tmin,
+            tmax)} limits the fitted points, by default the whole t range of
+            each channel is used. errors {channel: err_i_hv} gives the point
+            weights, channels without errors (or all zero) have equal
+            weights and their covariance is scaled by chi2/ndf.
+            Returns {channel: FitResult}, the fit names are prefix + channel '''
+        channels = sorted(points)
+        nchan = len(channels)
+        if nchan == 0:
+            return ( {} )
+        npoints = max([ len(points[channel][0]) for channel in channels ])
+        t = numpy.zeros((nchan, npoints))
+        i_hv = numpy.zeros((nchan, npoints))
+        weights = numpy.zeros((nchan, npoints))
+        unit_weights = numpy.ones(nchan, dtype = bool)
+        limits = []
+        for row, channel in enumerate(channels):
+            t_channel = numpy.asarray(points[channel][0], dtype = numpy.float64)
+            n = len(t_channel)
+            t[row, :n] = t_channel
+            i_hv[row, :n] = numpy.asarray(points[channel][1], dtype = numpy.float64)
+            if ranges != None and channel in ranges:
+                tmin, tmax = ranges[channel]
+            elif n:
+                tmin, tmax = t_channel.min(), t_channel.max()
+            else:
+                tmin, tmax = self.TMIN, self.TMAX
+            limits.append(( tmin, tmax ))
+            in_range = ( t_channel >= tmin ) & ( t_channel <= tmax )
+            weights[row, :n] = in_range
+            if errors != None and errors.get(channel) is not None:
+                err = numpy.asarray(errors[channel], dtype = numpy.float64)
+                if numpy.any(err[in_range] > 0.):
+                    weights[row, :n] = numpy.where(in_range & ( err > 0. ), 1. / numpy.maximum(err, 1e-300)**2, 0.)
+                    unit_weights[row] = False
+        # -> padded points sit at 0 deg C with no weight
+        ndf = numpy.sum(weights > 0., axis = 1) - self.PARAMS
+        weights[ndf < 0] = 0.
+        q, q_cov, chi2, converged, iterations = batch_levenberg_marquardt(self.__fit_model__, self.__fit_jacobian__, t, i_hv,
+                                                                         self.__fit_start__(t, i_hv, weights), weights)
+        scale = numpy.where(unit_weights & ( ndf > 0 ), chi2 / numpy.maximum(ndf, 1), 1.)
+        q_cov = q_cov * scale[:, None, None]
+        # -> back to A, B, E_g
+        A = q[:, 0]
+        B = numpy.exp(q[:, 1]) / A
+        to_params = numpy.zeros((nchan, 3, 3))
+        to_params[:, 0, 0] = 1.
+        to_params[:, 1, 0] = -B / A
+        to_params[:, 1, 1] = B
+        to_params[:, 2, 2] = 1.
+        cov = numpy.einsum('kij,kjl,kml->kim', to_params, q_cov, to_params)
+        params = numpy.column_stack((A, B, q[:, 2]))
+        results = {}
+        for row, channel in enumerate(channels):
+            if ndf[row] < 0:
+                nan = numpy.nan * numpy.ones(self.PARAMS)
+                results[channel] = FitResult(prefix + channel, self.np_model, nan, numpy.diag(nan), numpy.nan, int(ndf[row]), False,
+                                             limits[row][0], limits[row][1])
+                continue
+            results[channel] = FitResult(prefix + channel, self.np_model, params[row], cov[row], float(chi2[row]), int(ndf[row]),
+                                         bool(converged[row]), limits[row][0], limits[row][1], int(iterations[row]))
+
+        return ( results )